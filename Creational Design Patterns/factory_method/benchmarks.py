@@ -0,0 +1,260 @@
+"""
+    Benchmarks for the data extraction factory
+    ------------------------------------------
+    Each measurement runs in a fresh process so that the peak RSS reported
+    belongs to that code path alone.
+
+    Usage: python benchmarks.py [records] [first-record sizes in MB, e.g. 10,100,1024]
+"""
+import itertools
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import factory_pattern
+from factory_pattern import (ExtractionCache, dataextraction_factory, extract_data_from, extract_many,
+                             project_columns)
+
+PLANT = """\t<PLANT>
+\t<COMMON>plant{0}</COMMON>
+\t<BOTANICAL>{1}</BOTANICAL>
+\t<ZONE>{2}</ZONE>
+\t<LIGHT>Shady</LIGHT>
+\t<PRICE>{3}</PRICE>
+\t<AVAILABILITY>{4}</AVAILABILITY>
+\t</PLANT>
+"""
+BOTANICALS = ('canadensis', 'sunny', 'palustris', 'Caltha')
+
+
+def write_catalog(path, records):
+    with open(path, mode='w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<CATALOG>\n')
+        for i in range(records):
+            f.write(PLANT.format(i, BOTANICALS[i % len(BOTANICALS)], i % 9, i % 997, i % 1009))
+        f.write('</CATALOG>\n')
+
+
+def write_movies(path, records):
+    with open(path, mode='w', encoding='utf-8') as f:
+        f.write('[')
+        for i in range(records):
+            movie = {'title': f'Movie {i}', 'image': f'http://example.com/{i}.jpg',
+                     'rating': (i % 90) / 10, 'releaseYear': 1950 + i % 70, 'genre': ['Action', 'Drama']}
+            f.write((',\n' if i else '') + json.dumps(movie))
+        f.write(']')
+
+
+def peak_rss_mb():
+    # on Linux ru_maxrss carries the parent's peak into a spawned child,
+    # VmHWM belongs to the child's own address space
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_in_fresh_process(fn, *args):
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+        return pool.submit(fn, *args).result()
+
+
+def xml_full_tree(path):
+    start = time.perf_counter()
+    tree = dataextraction_factory(path).parsed_data
+    found = [plant.find('PRICE').text for plant in tree.findall(".//PLANT[BOTANICAL='canadensis']")]
+    return len(found), time.perf_counter() - start, peak_rss_mb()
+
+
+def xml_streaming(path):
+    start = time.perf_counter()
+    extractor = dataextraction_factory(path, streaming=True)
+    found = [plant.find('PRICE').text for plant in extractor.iter_records(where="BOTANICAL='canadensis'")]
+    return len(found), time.perf_counter() - start, peak_rss_mb()
+
+
+def json_first_matches(path, streaming, wanted=100):
+    start = time.perf_counter()
+    movies = dataextraction_factory(path, streaming=streaming).parsed_data
+    good = (movie for movie in movies if movie['rating'] >= 8.5)
+    found = list(itertools.islice(good, wanted))
+    return len(found), time.perf_counter() - start, peak_rss_mb()
+
+
+def bench_json(records):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'movies.json')
+        write_movies(path, records)
+        size_mb = os.path.getsize(path) / 2 ** 20
+        print(f'JSON: {records} movies, {size_mb:.1f} MB, first 100 with rating >= 8.5')
+        for name, streaming in (('json.load', False), ('streaming', True)):
+            found, elapsed, rss = run_in_fresh_process(json_first_matches, path, streaming)
+            print(f'  {name:<10} matches={found} {elapsed * 1000:>10.1f} ms  peak RSS {rss:.1f} MB')
+
+
+def bench_xml(records):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'plants.xml')
+        write_catalog(path, records)
+        size_mb = os.path.getsize(path) / 2 ** 20
+        print(f'XML: {records} PLANT records, {size_mb:.1f} MB')
+        for name, fn in (('full tree', xml_full_tree), ('streaming', xml_streaming)):
+            found, elapsed, rss = run_in_fresh_process(fn, path)
+            print(f'  {name:<10} matches={found} {records / elapsed:>12,.0f} records/s  peak RSS {rss:.1f} MB')
+
+
+def time_per_call(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def bench_cache(records):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'movies.json')
+        write_movies(path, records // 10)
+        print(f'Cache: repeated loads of {records // 10} movies')
+        uncached = time_per_call(lambda: extract_data_from(path), 5)
+        memory = ExtractionCache()
+        memory.get(path)
+        hit = time_per_call(lambda: extract_data_from(path, cache=memory), 10_000)
+        ExtractionCache(on_disk=True).get(path)
+        disk = time_per_call(lambda: extract_data_from(path, cache=ExtractionCache(on_disk=True)), 5)
+        print(f'  uncached   {uncached * 1e3:>10.2f} ms/load')
+        print(f'  disk tier  {disk * 1e3:>10.2f} ms/load')
+        print(f'  memory hit {hit * 1e6:>10.2f} us/load  {memory.cache_info()}')
+
+
+def count_records(extractor):
+    data = extractor.parsed_data
+    return len(data) if isinstance(data, list) else sum(1 for _ in data.iter('PLANT'))
+
+
+def bench_extract_many(files=400, records=500):
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(files):
+            path = os.path.join(tmp, f'part{i}.json' if i % 2 else f'part{i}.xml')
+            (write_movies if i % 2 else write_catalog)(path, records)
+            paths.append(path)
+        print(f'extract_many: {files} files of {records} records')
+        cores = os.cpu_count() or 1
+        workers = sorted({1, 2, 4, 8, cores} & set(range(1, cores + 1)))
+        for mode, fn in (('process', None), ('process', count_records), ('thread', None)):
+            label = f'{mode}{" fn" if fn else ""}'
+            for n in workers:
+                start = time.perf_counter()
+                failed = sum(result.error is not None
+                             for result in extract_many(paths, workers=n, mode=mode, fn=fn))
+                elapsed = time.perf_counter() - start
+                print(f'  {label:<10} workers={n:<3} {files / elapsed:>8.1f} files/s  failed={failed}')
+
+
+def bench_indexes(records, queries=50):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'plants.xml')
+        write_catalog(path, records)
+        extractor = dataextraction_factory(path)
+        tree = extractor.parsed_data
+        print(f'Indexes: {queries} queries over {records} PLANT records')
+
+        scan = time_per_call(lambda: tree.findall(".//PLANT[ZONE='4']"), queries)
+        price_scan = time_per_call(lambda: [p for p in tree.iter('PLANT') if 100 <= float(p.findtext('PRICE')) <= 110],
+                                   queries)
+        start = time.perf_counter()
+        extractor.create_index('ZONE')
+        extractor.create_index('PRICE', numeric=True)
+        build = time.perf_counter() - start
+        equal = time_per_call(lambda: extractor.find_equal('ZONE', '4'), queries)
+        ranged = time_per_call(lambda: extractor.find_range('PRICE', 100, 110), queries)
+        print(f'  index build          {build * 1e3:>10.2f} ms (once)')
+        print(f'  ZONE == 4      scan  {scan * 1e3:>10.3f} ms/query  index {equal * 1e3:.3f} ms/query')
+        print(f'  PRICE 100..110 scan  {price_scan * 1e3:>10.3f} ms/query  index {ranged * 1e3:.3f} ms/query')
+
+
+def mean_rating_from_dicts(path):
+    start = time.perf_counter()
+    movies = dataextraction_factory(path).parsed_data
+    mean = sum(movie['rating'] for movie in movies) / len(movies)
+    return mean, time.perf_counter() - start, peak_rss_mb()
+
+
+def mean_rating_from_columns(path):
+    start = time.perf_counter()
+    columns = project_columns(path, {'rating': float, 'releaseYear': int})
+    ratings = columns['rating']
+    mean = ratings.mean() if hasattr(ratings, 'mean') else sum(ratings) / len(ratings)
+    return mean, time.perf_counter() - start, peak_rss_mb()
+
+
+def bench_projection(records):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'movies.json')
+        write_movies(path, records)
+        print(f'Projection: mean rating over {records} movies')
+        for name, fn in (('dicts', mean_rating_from_dicts), ('columns', mean_rating_from_columns)):
+            mean, elapsed, rss = run_in_fresh_process(fn, path)
+            print(f'  {name:<10} mean={mean:.3f} {elapsed * 1e3:>10.1f} ms  peak RSS {rss:.1f} MB')
+
+
+def first_record_latency(path, mmap_threshold):
+    factory_pattern.MMAP_THRESHOLD = mmap_threshold
+    start = time.perf_counter()
+    records = iter(dataextraction_factory(path, streaming=True).parsed_data)
+    next(records)
+    first = time.perf_counter() - start
+    for _ in records:
+        pass
+    return first, time.perf_counter() - start, peak_rss_mb()
+
+
+def bench_first_record(sizes_mb, rounds=5):
+    print(f'Open-to-first-record and full read (streaming mode, extension-less files), '
+          f'median of {rounds} fresh processes per mode')
+    modes = (('buffered', float('inf')), ('mmap', 0))
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_mb in sizes_mb:
+            # roughly 170 bytes per record in both formats
+            records = size_mb * 2 ** 20 // 170
+            for fmt, write in (('json', write_movies), ('xml', write_catalog)):
+                # no extension, so the factory has to sniff the content
+                path = os.path.join(tmp, f'{fmt}{size_mb}')
+                write(path, records)
+                # alternate the modes so that neither always runs on a colder page cache
+                runs = {mode: [] for mode, _ in modes}
+                for _ in range(rounds):
+                    for mode, threshold in modes:
+                        runs[mode].append(run_in_fresh_process(first_record_latency, path, threshold))
+                for mode, _ in modes:
+                    first, full, rss = (statistics.median(values) for values in zip(*runs[mode]))
+                    print(f'  {fmt:<4} {size_mb:>5} MB  {mode:<8} first {first * 1e3:>8.3f} ms  '
+                          f'full {full:>7.2f} s  peak RSS {rss:.1f} MB')
+                os.remove(path)
+
+
+def main():
+    records = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    bench_xml(records)
+    bench_json(records)
+    bench_cache(records)
+    bench_extract_many()
+    bench_indexes(records)
+    bench_projection(records)
+    sizes_mb = [int(size) for size in sys.argv[2].split(',')] if len(sys.argv) > 2 else [10, 100]
+    bench_first_record(sizes_mb)
+
+
+if __name__ == '__main__':
+    main()
@@ -21,51 +21,475 @@
     Example here
     ------------
 """
+import array
+import bisect
+import codecs
+import contextlib
+import functools
 import json
+import mmap
+import os
+import pickle
+import sys
 import xml.etree.ElementTree as etree
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# files at least this big are read through mmap instead of buffered I/O
+MMAP_THRESHOLD = 8 * 2 ** 20
+SNIFF_SIZE = 512
+
+extractor_registry = dict()
+extractor_sniffers = dict()
+
+
+def register_extractor(extension, sniff=None):
+    """Register an extractor class for a file extension.
+
+    `sniff` takes the first bytes of a file (leading BOM and whitespace
+    removed) and tells whether they look like this format. It is used when
+    the extension is missing or does not match the content.
+    """
+    def register(extractor):
+        extractor_registry[extension] = extractor
+        if sniff is not None:
+            extractor_sniffers[extractor] = sniff
+        return extractor
+
+    return register
+
+
+@contextlib.contextmanager
+def open_source(filepath):
+    """Open `filepath` for binary reads, memory-mapped when it is large.
+
+    Both a file object and an mmap offer read(n), so parsers consume either
+    one; a mapped file is read straight from the page cache without the
+    buffered and text I/O layers in between.
+    """
+    with open(filepath, mode='rb') as f:
+        if os.fstat(f.fileno()).st_size < MMAP_THRESHOLD:
+            yield f
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield mm
+
+
+def sniff_head(filepath):
+    try:
+        with open(filepath, mode='rb') as f:
+            head = f.read(SNIFF_SIZE)
+    except OSError:
+        # leave reporting a missing or unreadable file to the extractor
+        return b''
+    return head.removeprefix(codecs.BOM_UTF8).lstrip()
+
+
+@register_extractor('json', sniff=lambda head: head[:1] in (b'[', b'{'))
 class JSONDataExtractor:
-    def __init__(self, filepath):
-        self.data = dict()
-        with open(filepath, mode='r', encoding='utf-8') as f:
-            self.data = json.load(f)
-        
+    chunk_size = 64 * 1024
+    disk_cacheable = True
+
+    def __init__(self, filepath, streaming=False):
+        self.filepath = filepath
+        self.streaming = streaming
+        self.data = None
+        if not streaming:
+            with open_source(filepath) as source:
+                self.data = json.load(source)
+
     @property
     def parsed_data(self):
+        if self.streaming:
+            return self.iter_records()
         return self.data
 
+    def iter_records(self):
+        """Yield each element of a top-level JSON array as soon as it is decoded.
+
+        The file is read `chunk_size` characters at a time and every element is
+        decoded with `raw_decode` over a sliding buffer, so only the element
+        being decoded has to fit in memory. An element that does not fit in the
+        buffer doubles the next read, which keeps large elements linear.
+        """
+        decoder = json.JSONDecoder()
+        text = codecs.getincrementaldecoder('utf-8-sig')()
+        with open_source(self.filepath) as source:
+            buf, pos, eof = '', 0, False
+            read_size = self.chunk_size
+
+            def fill(buf, pos, size):
+                data = source.read(size)
+                return buf[pos:] + text.decode(data, final=not data), 0, not data
 
+            def skip(buf, pos, eof):
+                while True:
+                    while pos < len(buf) and buf[pos] in ' \t\r\n':
+                        pos += 1
+                    if pos < len(buf) or eof:
+                        return buf, pos, eof
+                    buf, pos, eof = fill(buf, pos, self.chunk_size)
+
+            buf, pos, eof = skip(buf, pos, eof)
+            if buf[pos:pos + 1] != '[':
+                raise ValueError(f'{self.filepath} does not hold a top-level JSON array')
+            buf, pos, eof = skip(buf, pos + 1, eof)
+            if buf[pos:pos + 1] == ']':
+                return
+
+            while True:
+                buf, pos, eof = skip(buf, pos, eof)
+                if pos >= len(buf):
+                    raise ValueError(f'Unterminated JSON array in {self.filepath}')
+                if buf[pos] in ',]':
+                    raise ValueError(f'Malformed JSON array in {self.filepath}')
+                try:
+                    record, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    buf, pos, eof = fill(buf, pos, read_size)
+                    read_size *= 2
+                    continue
+                # only trust the element once its delimiter is in the buffer,
+                # a number such as 1e5 may be cut short at the chunk boundary
+                after = end
+                while after < len(buf) and buf[after] in ' \t\r\n':
+                    after += 1
+                if after == len(buf):
+                    if eof:
+                        raise ValueError(f'Unterminated JSON array in {self.filepath}')
+                    buf, pos, eof = fill(buf, pos, read_size)
+                    read_size *= 2
+                    continue
+                if buf[after] not in ',]':
+                    raise ValueError(f'Malformed JSON array in {self.filepath}')
+                yield record
+                if buf[after] == ']':
+                    return
+                pos, read_size = after + 1, self.chunk_size
+
+    def iter_rows(self, names):
+        records = self.iter_records() if self.streaming else self.data
+        for record in records:
+            yield tuple(record.get(name) for name in names)
+
+
+@register_extractor('xml', sniff=lambda head: head[:1] == b'<')
 class XMLDataExtractor:
-    def __init__(self, filepath):
-        self.tree = etree.parse(filepath)
+    # unpickling an ElementTree is several times slower than parsing the XML again
+    disk_cacheable = False
+
+    def __init__(self, filepath, streaming=False):
+        self.filepath = filepath
+        self.tree = None
+        # (record_tag, tag) -> {text: records} and -> (sorted keys, records)
+        self.hash_indexes = dict()
+        self.sorted_indexes = dict()
+        if not streaming:
+            with open_source(filepath) as source:
+                self.tree = etree.parse(source)
 
     @property
     def parsed_data(self):
+        if self.tree is None:
+            return self.iter_records()
         return self.tree
 
+    def iter_records(self, tag='PLANT', where=None):
+        """Yield one `tag` element at a time without building the whole tree.
 
-def dataextraction_factory(filepath: str):
-    if filepath.endswith('json'):
-        extractor = JSONDataExtractor
-    elif filepath.endswith('xml'):
-        extractor = XMLDataExtractor
-    else:
+        `where` is either a callable taking the element or a simple path
+        filter such as "BOTANICAL='canadensis'". Each record is cleared once
+        the caller moves on to the next one, so copy out what you need.
+        """
+        if isinstance(where, str):
+            path = f'.[{where}]'
+            where = lambda elem: elem.find(path) is not None
+
+        root = None
+        with open_source(self.filepath) as source:
+            for event, elem in etree.iterparse(source, events=('start', 'end')):
+                if root is None:
+                    root = elem
+                    continue
+                if event != 'end' or elem.tag != tag:
+                    continue
+                if where is None or where(elem):
+                    yield elem
+                elem.clear()
+                # drop the finished records still referenced by the root
+                root.clear()
+
+
+    def iter_rows(self, names, record_tag='PLANT'):
+        records = self.iter_records(record_tag) if self.tree is None else self.tree.iter(record_tag)
+        for record in records:
+            yield tuple(record.findtext(name) for name in names)
+
+    def create_index(self, tag, numeric=False, record_tag='PLANT'):
+        """Index the `record_tag` records of the parsed tree by their child `tag`.
+
+        A hash index answers equality queries on the text, a numeric
+        (sorted) index answers range queries with bisect. The two are kept
+        apart on the extractor and reused by every later query.
+        """
+        if self.tree is None:
+            raise ValueError('Indexes need the parsed tree, not streaming mode')
+
+        if numeric:
+            entries = []
+            for record in self.tree.iter(record_tag):
+                try:
+                    entries.append((float(record.findtext(tag)), len(entries), record))
+                except (TypeError, ValueError):
+                    continue
+            entries.sort()
+            index = ([key for key, _, _ in entries], [record for _, _, record in entries])
+        else:
+            index = dict()
+            for record in self.tree.iter(record_tag):
+                index.setdefault(record.findtext(tag), []).append(record)
+
+        (self.sorted_indexes if numeric else self.hash_indexes)[record_tag, tag] = index
+        return index
+
+    def find_equal(self, tag, value, record_tag='PLANT'):
+        """Return the records whose `tag` text equals `value`."""
+        index = self.hash_indexes.get((record_tag, tag))
+        if index is None:
+            index = self.create_index(tag, record_tag=record_tag)
+        return list(index.get(value, ()))
+
+    def find_range(self, tag, low=None, high=None, record_tag='PLANT'):
+        """Return the records whose numeric `tag` lies within [low, high]."""
+        index = self.sorted_indexes.get((record_tag, tag))
+        if index is None:
+            index = self.create_index(tag, numeric=True, record_tag=record_tag)
+        keys, records = index
+        start = 0 if low is None else bisect.bisect_left(keys, low)
+        stop = len(keys) if high is None else bisect.bisect_right(keys, high)
+        return records[start:stop]
+
+
+def extractor_class(filepath):
+    """Return the extractor class for `filepath`, by extension and content."""
+    extension = os.path.splitext(filepath)[1].lstrip('.').lower()
+    extractor = extractor_registry.get(extension)
+
+    head = sniff_head(filepath)
+    sniff = extractor_sniffers.get(extractor)
+    if extractor is None or (sniff is not None and not sniff(head)):
+        extractor = next((cls for cls, sniff in extractor_sniffers.items() if sniff(head)), extractor)
+
+    if extractor is None:
         raise ValueError(f"Cannot extract data from {filepath}")
+    return extractor
+
+
+def dataextraction_factory(filepath: str, streaming=False):
+    return extractor_class(filepath)(filepath, streaming=streaming)
+
+
+class ExtractionCache:
+    """Cache parsed extractors keyed by (realpath, st_mtime_ns, st_size).
+
+    The in-memory tier is an LRU bounded by `maxsize` entries. The disk
+    tier is off by default. With `on_disk=True` a pickled copy of each
+    parsed extractor is also written next to the source file
+    (`<file>.pickle`) and reused by later processes as long as the source
+    file is unchanged. Only enable it for directories nobody else can
+    write to, since loading a pickle can run arbitrary code, and measure
+    first: a pickled JSON extractor loads about as fast as json.load
+    parses the source, and a pickled XML tree loads slower, so XML
+    extractors (`disk_cacheable = False`) never use it. The tier is best
+    effort, an unreadable or stale pickle is parsed again. Cached
+    extractors are shared, so callers must not mutate their parsed data.
+    """
+    disk_suffix = '.pickle'
+
+    def __init__(self, maxsize=32, on_disk=False):
+        self.maxsize = maxsize
+        self.on_disk = on_disk
+        self.entries = OrderedDict()
+        self.hits = self.misses = self.disk_hits = self.evictions = 0
+
+    def get(self, filepath):
+        stat = os.stat(filepath)
+        realpath = os.path.realpath(filepath)
+        key = (realpath, stat.st_mtime_ns, stat.st_size)
 
-    return extractor(filepath)
+        extractor = self.entries.get(realpath)
+        if extractor is not None and extractor[0] == key:
+            self.hits += 1
+            self.entries.move_to_end(realpath)
+            return extractor[1]
 
+        self.misses += 1
+        cls = extractor_class(filepath)
+        on_disk = self.on_disk and getattr(cls, 'disk_cacheable', True)
+        extractor = self._load_from_disk(key) if on_disk else None
+        if extractor is None:
+            extractor = cls(filepath)
+            if on_disk:
+                self._save_to_disk(key, extractor)
+        else:
+            self.disk_hits += 1
 
-def extract_data_from(filepath):
+        self.entries[realpath] = (key, extractor)
+        self.entries.move_to_end(realpath)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return extractor
+
+    def _load_from_disk(self, key):
+        try:
+            with open(key[0] + self.disk_suffix, mode='rb') as f:
+                if pickle.load(f) != key:
+                    return None
+                return pickle.load(f)
+        except Exception:
+            # e.g. a pickle of an older class layout, or written under __main__
+            return None
+
+    def _save_to_disk(self, key, extractor):
+        path = key[0] + self.disk_suffix
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, mode='wb') as f:
+                pickle.dump(key, f, pickle.HIGHEST_PROTOCOL)
+                pickle.dump(extractor, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except OSError:
+            # the disk tier is best effort, e.g. for read-only directories
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def cache_info(self):
+        return {'hits': self.hits, 'misses': self.misses, 'disk_hits': self.disk_hits,
+                'evictions': self.evictions, 'size': len(self.entries), 'maxsize': self.maxsize}
+
+    def clear(self):
+        self.entries.clear()
+
+
+def extract_data_from(filepath, streaming=False, cache=None):
     factory_obj = None
 
     try:
-        factory_obj = dataextraction_factory(filepath)
+        if cache is not None and not streaming:
+            factory_obj = cache.get(filepath)
+        else:
+            factory_obj = dataextraction_factory(filepath, streaming=streaming)
     except ValueError as ve:
         print(ve)
     
     return factory_obj
 
 
+COLUMN_TYPECODES = {int: 'q', float: 'd'}
+
+
+def project_columns(filepath, fields):
+    """Read only `fields` from every record of `filepath` into typed columns.
+
+    `fields` maps a field name (a JSON key or an XML child tag) to int, float
+    or str. Numeric columns come back as NumPy arrays when NumPy is installed
+    and as array.array otherwise; str columns are lists of interned strings.
+    Missing float values become NaN and missing str values None; int
+    columns have no missing value, so a record without one raises
+    ValueError.
+    """
+    names = list(fields)
+    columns = []
+    for name in names:
+        kind = fields[name]
+        if kind in COLUMN_TYPECODES:
+            columns.append(array.array(COLUMN_TYPECODES[kind]))
+        elif kind is str:
+            columns.append([])
+        else:
+            raise ValueError(f"Cannot project {name} as {kind}")
+
+    converters = []
+    for name in names:
+        kind = fields[name]
+        if kind is str:
+            converters.append(lambda value: sys.intern(str(value)) if value is not None else None)
+        elif kind is float:
+            converters.append(lambda value: float('nan') if value is None else float(value))
+        else:
+            def convert(value, name=name):
+                if value is None:
+                    raise ValueError(f"{filepath} has a record without {name}, project it as float to get NaN")
+                return int(value)
+            converters.append(convert)
+
+    appenders = [(column.append, convert) for column, convert in zip(columns, converters)]
+    for row in dataextraction_factory(filepath, streaming=True).iter_rows(names):
+        for (append, convert), value in zip(appenders, row):
+            append(convert(value))
+
+    if numpy is not None:
+        columns = [numpy.frombuffer(column, dtype=column.typecode) if isinstance(column, array.array) else column
+                   for column in columns]
+    return dict(zip(names, columns))
+
+
+ExtractionResult = namedtuple('ExtractionResult', 'filepath extractor error result', defaults=(None,))
+
+
+def _extract_one(filepath, fn=None, keep_extractor=True):
+    try:
+        extractor = dataextraction_factory(filepath)
+        result = fn(extractor) if fn is not None else None
+    except Exception as e:
+        return ExtractionResult(filepath, None, e)
+    return ExtractionResult(filepath, extractor if keep_extractor else None, None, result)
+
+
+def extract_many(filepaths, workers=None, mode='process', ordered=True, fn=None):
+    """Extract many files in parallel and yield an ExtractionResult per file.
+
+    Results follow the order of `filepaths` unless `ordered` is False, in
+    which case they are yielded as they complete. A file that fails to
+    extract yields a result carrying the exception instead of the extractor.
+
+    `fn`, if given, is called with each extractor in the worker and its
+    return value becomes the result's `result`. In process mode the
+    extractor itself then stays in the worker: pickling a parsed tree back
+    to the parent costs several times the parse, so without `fn` process
+    mode is slower than thread mode. `fn` must be picklable in process
+    mode, e.g. a module-level function.
+    """
+    if mode == 'process':
+        executor = ProcessPoolExecutor
+    elif mode == 'thread':
+        executor = ThreadPoolExecutor
+    else:
+        raise ValueError(f"Unknown extraction mode: {mode}")
+
+    extract = functools.partial(_extract_one, fn=fn, keep_extractor=fn is None or mode == 'thread')
+    return _iter_extract(executor, extract, list(filepaths), workers or os.cpu_count() or 1, mode, ordered)
+
+
+def _iter_extract(executor, extract, filepaths, workers, mode, ordered):
+    with executor(max_workers=workers) as pool:
+        if ordered:
+            chunksize = max(1, len(filepaths) // (workers * 4)) if mode == 'process' else 1
+            yield from pool.map(extract, filepaths, chunksize=chunksize)
+        else:
+            futures = [pool.submit(extract, filepath) for filepath in filepaths]
+            for future in as_completed(futures):
+                yield future.result()
+
+
 def main():
     json_factory = extract_data_from('movies.json')
     json_data = json_factory.parsed_data
@@ -74,7 +498,7 @@ def main():
 
     xml_factory = extract_data_from('persons.xml')
     xml_data = xml_factory.parsed_data
-    botanical = xml_data.findall(f".//PLANT[BOTANICAL='canadensis']")
+    botanical = xml_factory.find_equal('BOTANICAL', 'canadensis')
     print(f'Found: {len(botanical)} entries')
     for canadensises in botanical:
         common = canadensises.find('COMMON').text
@@ -0,0 +1,126 @@
+"""
+    Benchmarks for the prototype pattern
+    ------------------------------------
+    Usage: python benchmarks.py [clones] [bulk clones] [sites]
+"""
+import sys
+import time
+import tracemalloc
+
+from prototype_website import Prototype, Website
+
+
+class DictWebsite:
+    """The Website layout before slots: every attribute in an instance dict."""
+
+    def __init__(self, name, domain, description, author, **kwargs):
+        self.name = name
+        self.domain = domain
+        self.description = description
+        self.author = author
+        for key in kwargs:
+            setattr(self, key, kwargs[key])
+
+
+def make_site():
+    keywords = tuple(f'keyword-{i}' for i in range(1000))
+    metadata = {f'page-{i}': {'links': list(range(20)), 'title': f'Page {i}'} for i in range(200)}
+    return Website(name='ContentGardening',
+                   domain='contentgardening.com',
+                   description='Automation and data-driven apps',
+                   author='Kamon Ayeva',
+                   category='blog',
+                   keywords=keywords,
+                   metadata=metadata)
+
+
+def check_clone_writes():
+    """Attributes written to or deleted from a clone must stay that way,
+    whatever the strategy, and leave the prototype's attributes in place."""
+    for strategy in Prototype.strategies:
+        prototype = Prototype()
+        prototype.register('site', make_site(), strategy=strategy)
+        clone = prototype.clone('site', name='clone')
+        clone.metadata = {'new': 1}
+        assert clone.metadata == {'new': 1}, strategy
+        del clone.keywords
+        assert not hasattr(clone, 'keywords'), strategy
+        clone = prototype.clone('site')
+        if strategy != 'shallow':
+            # shallow clones share their mutable values with the prototype by design
+            clone.metadata['page-0']['title'] = 'Changed'
+            assert clone.metadata['page-0']['title'] == 'Changed', strategy
+            assert prototype.objects['site'].metadata['page-0']['title'] == 'Page 0', strategy
+        del clone.metadata
+        assert not hasattr(clone, 'metadata'), strategy
+        assert len(prototype.objects['site'].keywords) == 1000, strategy
+
+
+def bench_clone_strategies(clones):
+    print(f'Prototype.clone: {clones:,} clones of a site with 1000 keywords and 200 metadata pages')
+    for strategy in Prototype.strategies:
+        prototype = Prototype()
+        prototype.register('site', make_site(), strategy=strategy)
+
+        start = time.perf_counter()
+        for i in range(clones):
+            prototype.clone('site', name=f'site {i}')
+        elapsed = time.perf_counter() - start
+
+        tracemalloc.start()
+        kept = [prototype.clone('site', name=f'site {i}') for i in range(min(clones, 1000))]
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f'  {strategy:<8} {clones / elapsed:>12,.0f} clones/s  {size / len(kept):>10,.0f} B/clone')
+
+
+def bench_clone_many(clones):
+    print(f'Prototype.clone_many: {clones:,} variants of the example site')
+    site = Website(name='ContentGardening', domain='contentgardening.com',
+                   description='Automation and data-driven apps', author='Kamon Ayeva',
+                   category='blog', keywords=('python', 'data', 'apis', 'automation'))
+    overrides = [{'name': f'site {i}', 'domain': f'site{i}.contentgardening.com'} for i in range(clones)]
+    for strategy in Prototype.strategies:
+        prototype = Prototype()
+        prototype.register('site', site, strategy=strategy)
+
+        start = time.perf_counter()
+        for attrs in overrides:
+            prototype.clone('site', **attrs)
+        loop = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in prototype.clone_many('site', overrides):
+            pass
+        bulk = time.perf_counter() - start
+        print(f'  {strategy:<8} clone loop {clones / loop:>12,.0f} clones/s  clone_many {clones / bulk:>12,.0f} clones/s')
+
+
+def bench_instance_size(sites):
+    print(f'Bytes per instance: {sites:,} sites, attribute values shared')
+    names = [f'site {i}' for i in range(sites)]
+    keywords = ('python', 'data', 'apis', 'automation')
+    for label, cls in (('dict', DictWebsite), ('slots', Website)):
+        for optional in ({}, {'category': 'blog', 'keywords': keywords},
+                         {'category': 'blog', 'keywords': keywords, 'technology': 'python',
+                          'creation_date': '2020-10-05'}):
+            tracemalloc.start()
+            kept = [cls(name, 'contentgardening.com', 'Automation and data-driven apps', 'Kamon Ayeva', **optional)
+                    for name in names]
+            size, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            # the list holding the sites is not part of them
+            size -= sys.getsizeof(kept)
+            print(f'  {label:<6} {len(optional)} optional attributes {size / sites:>8,.1f} B/instance')
+
+
+def main():
+    clones = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    check_clone_writes()
+    bench_clone_strategies(clones)
+    bench_clone_many(int(sys.argv[2]) if len(sys.argv) > 2 else 100_000)
+    bench_instance_size(int(sys.argv[3]) if len(sys.argv) > 3 else 100_000)
+
+
+if __name__ == '__main__':
+    main()
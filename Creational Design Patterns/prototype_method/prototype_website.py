@@ -1,4 +1,5 @@
 import copy
+import functools
 """
     Prototype Pattern
     -----------------
@@ -15,41 +16,288 @@ import copy
     
 """
 
+class _Layout:
+    """Names of the optional attributes of a group of websites.
+
+    Websites with the same optional attributes, set in the same order,
+    share one layout and store only a tuple of it and their values, like
+    the shared keys of CPython's instance dicts. Adding an attribute moves
+    a site to the next layout, which is created once and reused by every
+    site.
+    """
+    __slots__ = ('names', 'index', '_next')
+
+    def __init__(self, names=()):
+        self.names = names
+        # positions in the extra tuple, whose first item is the layout itself
+        self.index = {name: i for i, name in enumerate(names, 1)}
+        self._next = dict()
+
+    @staticmethod
+    def get(names):
+        layout = _layouts.get(names)
+        if layout is None:
+            layout = _layouts.setdefault(names, _Layout(names))
+        return layout
+
+    def add(self, name):
+        layout = self._next.get(name)
+        if layout is None:
+            layout = self._next[name] = _Layout.get(self.names + (name,))
+        return layout
+
+    def remove(self, name):
+        return _Layout.get(tuple(other for other in self.names if other != name))
+
+
+_EMPTY_LAYOUT = _Layout()
+_EMPTY_EXTRA = (_EMPTY_LAYOUT,)
+_layouts = {(): _EMPTY_LAYOUT}
+_state_plans = dict()  # names in a state dict -> (setters of the core ones, _Layout of the others)
+
+
 class Website:
+    """A website with four core fields and any number of optional ones.
+
+    Core fields live in slots and optional attributes in one tuple, a
+    shared _Layout followed by their values, so a site needs no instance
+    dict. The summary printed by str() is cached until an attribute is set
+    or deleted; changing an attribute's value in place does not refresh
+    it. The price of the compact layout is that copies and clones go
+    through __getstate__/__setstate__ in Python, which is slower than
+    copying an instance dict.
+    """
+    __slots__ = ('name', 'domain', 'description', 'author', '_extra', '_summary')
+    _core = ('name', 'domain', 'description', 'author')
+
     def __init__(self, name, domain, description, author, **kwargs):
         """Examples of optional attributes (kwargs)
         category, creation_date, technology, keywords
         """
-        self.name = name
-        self.domain = domain
-        self.description = description
-        self.author = author
-        for key in kwargs:
-            setattr(self, key, kwargs[key])
-
-    @property
+        _set_name(self, name)
+        _set_domain(self, domain)
+        _set_description(self, description)
+        _set_author(self, author)
+        _set_extra(self, (_Layout.get(tuple(kwargs)), *kwargs.values()) if kwargs else _EMPTY_EXTRA)
+
+    def _get_extra(self):
+        try:
+            return object.__getattribute__(self, '_extra')
+        except AttributeError:
+            return _EMPTY_EXTRA
+
+    def __getattr__(self, name):
+        extra = self._get_extra()
+        i = extra[0].index.get(name)
+        if i is None:
+            raise AttributeError(f'{type(self).__name__!r} object has no attribute {name!r}')
+        return extra[i]
+
+    def __setattr__(self, name, value):
+        setter = _core_setters.get(name)
+        if setter is not None:
+            setter(self, value)
+        else:
+            extra = self._get_extra()
+            i = extra[0].index.get(name)
+            if i is None:
+                extra = (extra[0].add(name), *extra[1:], value)
+            else:
+                extra = extra[:i] + (value,) + extra[i + 1:]
+            _set_extra(self, extra)
+        _set_summary(self, None)
+
+    def __delattr__(self, name):
+        if name in Website._core:
+            object.__delattr__(self, name)
+        else:
+            extra = self._get_extra()
+            i = extra[0].index.get(name)
+            if i is None:
+                raise AttributeError(f'{type(self).__name__!r} object has no attribute {name!r}')
+            _set_extra(self, (extra[0].remove(name),) + extra[1:i] + extra[i + 1:])
+        _set_summary(self, None)
+
+    def __getstate__(self):
+        try:
+            state = {'name': self.name, 'domain': self.domain, 'description': self.description,
+                     'author': self.author}
+        except AttributeError:
+            # a core field has been deleted
+            state = dict()
+            for name in Website._core:
+                try:
+                    state[name] = object.__getattribute__(self, name)
+                except AttributeError:
+                    pass
+        extra = self._get_extra()
+        if len(extra) > 1:
+            state.update(zip(extra[0].names, extra[1:]))
+        return state
+
+    def __setstate__(self, state):
+        names = tuple(state)
+        plan = _state_plans.get(names)
+        if plan is None:
+            setters = tuple((name, _core_setters[name]) for name in names if name in _core_setters)
+            layout = _Layout.get(tuple(name for name in names if name not in _core_setters))
+            plan = _state_plans.setdefault(names, (setters, layout))
+        setters, layout = plan
+        for name, setter in setters:
+            setter(self, state[name])
+        _set_extra(self, (layout, *map(state.__getitem__, layout.names)) if layout.names else _EMPTY_EXTRA)
+
     def __str__(self) -> str:
-        summary = [f'Website: {self.name}.\n', ]
-        info = vars(self).items()
-        ordered_info = sorted(info)
+        try:
+            summary = object.__getattribute__(self, '_summary')
+        except AttributeError:
+            summary = None
+        if summary is None:
+            info = self.__getstate__()
+            lines = [f'Website: {info.pop("name", None)}.\n']
+            lines.extend(f'{attr}: {val}\n' for attr, val in sorted(info.items()))
+            summary = ''.join(lines)
+            _set_summary(self, summary)
+        return summary
+
+
+# slot descriptors set values without going through Website.__setattr__
+_set_name, _set_domain, _set_description, _set_author, _set_extra, _set_summary = (
+    vars(Website)[name].__set__ for name in Website.__slots__)
+_core_setters = {name: vars(Website)[name].__set__ for name in Website._core}
+
+
+_ATOMIC_TYPES = (str, bytes, int, float, complex, bool, type(None))
+
+
+def _is_immutable(value):
+    if isinstance(value, _ATOMIC_TYPES):
+        return True
+    if type(value) in (tuple, frozenset):
+        return all(_is_immutable(item) for item in value)
+    return False
+
+
+def _attributes(state):
+    """Flatten what __getstate__ returned into one dict of attributes."""
+    if isinstance(state, tuple):
+        state, slots = state
+        return {**(state or {}), **(slots or {})}
+    return dict(state or {})
+
+
+@functools.lru_cache(maxsize=None)
+def _restorer(cls):
+    """Return restore(obj, state, attrs), which sets `state` and then the
+    overrides in `attrs` on a new instance of `cls`.
+
+    A class with a __setstate__ gets both in one call, as copy and pickle
+    would hand it its state. Slots are set one by one, they are hidden
+    behind their descriptors when written into __dict__.
+    """
+    setstate = getattr(cls, '__setstate__', None)
+    if setstate is not None:
+        def restore(obj, state, attrs):
+            setstate(obj, {**state, **attrs} if attrs else state)
+    elif any('__slots__' in vars(klass) for klass in cls.__mro__):
+        def restore(obj, state, attrs):
+            for key in state:
+                setattr(obj, key, state[key])
+            for key in attrs:
+                setattr(obj, key, attrs[key])
+    else:
+        def restore(obj, state, attrs):
+            obj.__dict__.update(state)
+            for key in attrs:
+                setattr(obj, key, attrs[key])
+    return restore
+
 
-        for attr, val in ordered_info:
-            if attr == 'name':
-                continue
-            summary.append(f'{attr}: {val}\n')
+def _rebuild(cls, state):
+    obj = cls.__new__(cls)
+    _restorer(cls)(obj, state, {})
+    return obj
 
-        return ''.join(summary)
+
+class CopyOnWrite:
+    """Mixin of copy-on-write clones.
+
+    Mutable attributes are not copied when the clone is made. They stay
+    pending, shared with the prototype, and the first access copies one
+    into the clone, so untouched sub-structures are never copied. The
+    prototype must not be mutated in place while clones are pending.
+    Pending attributes are kept in a `_cow_pending` slot of the subclass
+    Prototype makes, so slotted classes stay without an instance dict.
+    """
+    __slots__ = ()
+
+    def __getattr__(self, name):
+        pending = self._cow_pending if name != '_cow_pending' else None
+        if not pending or name not in pending:
+            fallback = getattr(super(), '__getattr__', None)
+            if fallback is None:
+                raise AttributeError(f'{type(self).__name__!r} object has no attribute {name!r}')
+            return fallback(name)
+        value = copy.deepcopy(pending.pop(name))
+        setattr(self, name, value)
+        return value
+
+    def _pending(self):
+        try:
+            return object.__getattribute__(self, '_cow_pending')
+        except AttributeError:
+            return None
+
+    def __setattr__(self, name, value):
+        # a written attribute is no longer pending, or the next read would
+        # copy the prototype's value over it
+        pending = self._pending()
+        if pending:
+            pending.pop(name, None)
+        super().__setattr__(name, value)
+
+    def __delattr__(self, name):
+        pending = self._pending()
+        if pending and name in pending:
+            # set the shared value without copying it, so that the class's own
+            # __delattr__ runs on an attribute that exists
+            super().__setattr__(name, pending.pop(name))
+        super().__delattr__(name)
+
+    def __getstate__(self):
+        state = _attributes(super().__getstate__())
+        state.pop('_cow_pending', None)
+        state.update(self._cow_pending)
+        return state
+
+    def __reduce_ex__(self, protocol):
+        # copy-on-write classes are made at run time and cannot be found by
+        # name, so a pickled clone comes back as the prototype's class
+        return _rebuild, (type(self)._cow_base, self.__getstate__())
 
 
 class Prototype:
+    strategies = ('deep', 'shallow', 'cow')
+
     def __init__(self):
         self.objects = dict()
+        self.clone_strategies = dict()
+        self._cow_classes = dict()
+        self._cloners = dict()
 
-    def register(self, identifier, obj):
+    def register(self, identifier, obj, strategy='deep'):
+        """Register `obj`, cloned with copy.deepcopy ('deep'), copy.copy
+        plus overrides ('shallow') or copy-on-write ('cow')."""
+        if strategy not in self.strategies:
+            raise ValueError(f'Unknown clone strategy: {strategy}')
         self.objects[identifier] = obj
+        self.clone_strategies[identifier] = strategy
+        self._cloners.pop(identifier, None)
 
     def unregister(self, identifier):
         del self.objects[identifier]
+        del self.clone_strategies[identifier]
+        self._cloners.pop(identifier, None)
 
     def clone(self, identifier, **attrs):
         found = self.objects.get(identifier)
@@ -57,12 +305,104 @@ class Prototype:
         if not found:
             raise ValueError(f'Incorrect object identifier: {identifier}')
 
-        obj = copy.deepcopy(found)
+        return self._cloner(identifier, found)(attrs)
+
+    def clone_many(self, identifier, overrides_iterable):
+        """Yield one clone per dict of attribute overrides in `overrides_iterable`.
+
+        The registry lookup and the analysis of the prototype's attributes
+        happen once, each clone then only copies what it does not override.
+        """
+        found = self.objects.get(identifier)
+
+        if not found:
+            raise ValueError(f'Incorrect object identifier: {identifier}')
+
+        return map(self._cloner(identifier, found), overrides_iterable)
+
+    def _cloner(self, identifier, found):
+        """Return the compiled cloner of `identifier`, compiled again when
+        one of the prototype's attributes has been reassigned."""
+        state = found.__getstate__()
+        state = _attributes(state) if state is None or isinstance(state, (dict, tuple)) else dict()
+        cached = self._cloners.get(identifier)
+        if cached is not None:
+            snapshot, cloner = cached
+            if len(snapshot) == len(state) and all(state.get(key) is value for key, value in snapshot.items()):
+                return cloner
+
+        cloner = self._compile_cloner(identifier, found)
+        self._cloners[identifier] = (state, cloner)
+        return cloner
+
+    def _compile_cloner(self, identifier, found):
+        strategy = self.clone_strategies[identifier]
+        cls = type(found)
+
+        if strategy == 'cow':
+            shared, pending = dict(), dict()
+            for key, value in _attributes(found.__getstate__()).items():
+                (shared if _is_immutable(value) else pending)[key] = value
+            cow_class = self._cow_class(cls)
+            set_pending = vars(cow_class)['_cow_pending'].__set__
+            restore = _restorer(cow_class)
+
+            def clone(attrs):
+                obj = object.__new__(cow_class)
+                set_pending(obj, {key: value for key, value in pending.items() if key not in attrs})
+                restore(obj, shared, attrs)
+                return obj
+
+            return clone
+
+        # copy and deepcopy rebuild these classes from a __getstate__ dict,
+        # which is all the fast path below needs to know about them
+        state = found.__getstate__()
+        plain = (cls.__reduce_ex__ is object.__reduce_ex__ and cls.__reduce__ is object.__reduce__
+                 and not hasattr(cls, '__copy__') and not hasattr(cls, '__deepcopy__')
+                 and isinstance(state, dict) and (hasattr(cls, '__setstate__') or hasattr(found, '__dict__')))
+        if not plain:
+            copier = copy.copy if strategy == 'shallow' else copy.deepcopy
+
+            def clone(attrs):
+                obj = copier(found)
+                for key in attrs:
+                    setattr(obj, key, attrs[key])
+                return obj
+
+            return clone
+
+        state = dict(state)
+        if strategy == 'shallow':
+            shared, mutable = state, dict()
+        else:
+            shared = {key: value for key, value in state.items() if _is_immutable(value)}
+            mutable = {key: value for key, value in state.items() if key not in shared}
+
+        restore = _restorer(cls)
+
+        def clone(attrs):
+            obj = object.__new__(cls)
+            obj_state = shared
+            if mutable:
+                obj_state = dict(shared)
+                # one memo per clone keeps references shared between attributes shared
+                memo = dict()
+                for key, value in mutable.items():
+                    if key not in attrs:
+                        obj_state[key] = copy.deepcopy(value, memo)
+            restore(obj, obj_state, attrs)
+            return obj
 
-        for key in attrs:
-            setattr(obj, key, attrs[key])
+        return clone
 
-        return obj
+    def _cow_class(self, cls):
+        cow_class = self._cow_classes.get(cls)
+        if cow_class is None:
+            cow_class = type(cls.__name__, (CopyOnWrite, cls), {
+                '__qualname__': cls.__qualname__, '__slots__': ('_cow_pending',), '_cow_base': cls})
+            self._cow_classes[cls] = cow_class
+        return cow_class
 
 
 def main():
@@ -0,0 +1,184 @@
+"""
+    Benchmarks for the singleton URLFetcher
+    ---------------------------------------
+    Every benchmark talks to a local http.server stand-in.
+
+    Usage: python benchmarks.py [requests] [concurrency]
+"""
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+import timeit
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from singleton_pattern import ResponseCache, URLFetcher
+
+BODY = b'x' * 1024
+
+
+class Handler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so that clients may keep the connection alive
+    protocol_version = 'HTTP/1.1'
+    # headers and body go out in separate writes, avoid Nagle/delayed-ACK stalls
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ETagHandler(Handler):
+    """Serves a large body with an ETag and honours If-None-Match."""
+    body = b'y' * 256 * 1024
+    etag = '"v1"'
+
+    def do_GET(self):
+        if self.headers.get('If-None-Match') == self.etag:
+            self.send_response(304)
+            self.send_header('ETag', self.etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', self.etag)
+        self.send_header('Content-Length', str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+
+class ArtifactHandler(Handler):
+    """Serves `size` bytes generated on the fly, so the server stays small."""
+    size = 256 * 2 ** 20
+    block = b'z' * 2 ** 20
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', str(self.size))
+        self.end_headers()
+        for _ in range(self.size // len(self.block)):
+            self.wfile.write(self.block)
+
+
+def start_server(handler=Handler):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def fetch_unpooled(url):
+    with urllib.request.urlopen(url) as res:
+        return res.read()
+
+
+def bench_fetch_many(requests, concurrency):
+    server = start_server()
+    base = f'http://127.0.0.1:{server.server_port}'
+    urls = [f'{base}/item/{i}' for i in range(requests)]
+    print(f'fetch_many: {requests} GETs, concurrency={concurrency}')
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        bodies = list(pool.map(fetch_unpooled, urls))
+    unpooled = time.perf_counter() - start
+    assert all(body == BODY for body in bodies)
+
+    fetcher = URLFetcher()
+    start = time.perf_counter()
+    results = fetcher.fetch_many(urls, concurrency=concurrency)
+    pooled = time.perf_counter() - start
+    failed = sum(result.error is not None or result.body != BODY for result in results)
+
+    print(f'  urlopen per URL  {requests / unpooled:>10,.0f} req/s')
+    print(f'  pooled fetch     {requests / pooled:>10,.0f} req/s  failed={failed}')
+    fetcher.close()
+    server.shutdown()
+
+
+def bench_response_cache(requests, urls=20):
+    server = start_server(ETagHandler)
+    paths = [f'http://127.0.0.1:{server.server_port}/artifact/{i}' for i in range(urls)]
+    print(f'Response cache: {requests} GETs over {urls} URLs serving 256 KB with an ETag')
+    fetcher = URLFetcher()
+
+    for label, ttl in (('fresh hits', 3600), ('revalidation', 0)):
+        fetcher.cache = ResponseCache(ttl=ttl)
+        start = time.perf_counter()
+        for i in range(requests):
+            result = fetcher.fetch(paths[i % urls])
+            assert result.body == ETagHandler.body
+        elapsed = time.perf_counter() - start
+        print(f'  {label:<13} {requests / elapsed:>10,.0f} req/s  {fetcher.cache.cache_info()}')
+
+    fetcher.cache = ResponseCache(max_bytes=0)
+    start = time.perf_counter()
+    for i in range(requests):
+        fetcher.fetch(paths[i % urls])
+    elapsed = time.perf_counter() - start
+    print(f'  {"no cache":<13} {requests / elapsed:>10,.0f} req/s')
+
+    fetcher.cache = ResponseCache()
+    fetcher.close()
+    server.shutdown()
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def bench_fetch_to():
+    server = start_server(ArtifactHandler)
+    url = f'http://127.0.0.1:{server.server_port}/artifact.bin'
+    size_mb = ArtifactHandler.size // 2 ** 20
+    fetcher = URLFetcher()
+    print(f'fetch_to: streaming a {size_mb} MB artifact')
+    before = peak_rss_mb()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'artifact.bin')
+        result = fetcher.fetch_to(url, path, chunk_size=256 * 1024)
+        assert os.path.getsize(path) == ArtifactHandler.size
+    print(f'  to file   {result.throughput / 2 ** 20:>8.0f} MB/s  peak RSS growth {peak_rss_mb() - before:.1f} MB')
+    result = fetcher.fetch_to(url, lambda chunk: None, chunk_size=256 * 1024)
+    print(f'  to sink   {result.throughput / 2 ** 20:>8.0f} MB/s  peak RSS growth {peak_rss_mb() - before:.1f} MB')
+    start = time.perf_counter()
+    fetcher.fetch(url)
+    throughput = ArtifactHandler.size / (time.perf_counter() - start)
+    print(f'  fetch()   {throughput / 2 ** 20:>8.0f} MB/s  peak RSS growth {peak_rss_mb() - before:.1f} MB')
+    fetcher.close()
+    server.shutdown()
+
+
+def bench_singleton_call(number=1_000_000):
+    URLFetcher()
+    instances = {URLFetcher: URLFetcher()}
+    print(f'Singleton hot path: {number:,} calls')
+    call = timeit.timeit('URLFetcher()', globals={'URLFetcher': URLFetcher}, number=number)
+    lookup = timeit.timeit('instances[URLFetcher]', globals={'URLFetcher': URLFetcher, 'instances': instances},
+                           number=number)
+    print(f'  URLFetcher()  {call / number * 1e9:>8.1f} ns/call')
+    print(f'  dict lookup   {lookup / number * 1e9:>8.1f} ns/call')
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    bench_singleton_call()
+    bench_fetch_many(requests, concurrency)
+    bench_response_cache(requests)
+    # run last, buffering the whole artifact would dwarf every earlier peak RSS
+    bench_fetch_to()
+
+
+if __name__ == '__main__':
+    main()
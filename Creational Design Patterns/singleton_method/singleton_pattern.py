@@ -14,33 +14,322 @@
     2. Scenario when there is an object capable of maintaining
     a global state for your program
 """
+import contextlib
+import http.client
+import os
+import threading
+import time
 import urllib.parse
-import urllib.request
+import weakref
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 
 
 class SingletonType(type):
     # '_' - underscore says that the field/property is private
     _instances = {}
+    _classes = weakref.WeakSet()
+
+    def __init__(cls, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        cls._singleton_lock = threading.Lock()
+        SingletonType._classes.add(cls)
 
     def __call__(cls, *args, **kwargs):
-        if cls not in cls._instances:
-            cls._instances[cls] = super(SingletonType, cls).__call__(*args, **kwargs)
-        return cls._instances[cls]
+        # fast path, no lock once the instance exists
+        instance = cls._instances.get(cls)
+        if instance is not None:
+            return instance
+
+        # double-checked so that racing threads build exactly one instance
+        with cls._singleton_lock:
+            instance = cls._instances.get(cls)
+            if instance is None:
+                instance = super(SingletonType, cls).__call__(*args, **kwargs)
+                cls._instances[cls] = instance
+        return instance
+
+    @classmethod
+    def _reset_after_fork(mcs):
+        # a child must not reuse the parent's sockets, nor a lock another thread held at fork time
+        mcs._instances.clear()
+        for cls in mcs._classes:
+            cls._singleton_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=SingletonType._reset_after_fork)
+
+
+FetchResult = namedtuple('FetchResult', 'url status body error')
+DownloadResult = namedtuple('DownloadResult', 'url status nbytes seconds throughput')
+REDIRECT_STATUSES = frozenset((301, 302, 303, 307, 308))
+
+
+class CachedResponse:
+    def __init__(self, body, etag, last_modified):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored_at = time.monotonic()
+
+
+class ResponseCache:
+    """LRU cache of response bodies bounded by their total size in bytes.
+
+    Entries younger than `ttl` seconds are served without a request, older
+    ones are revalidated with If-None-Match/If-Modified-Since.
+    """
+
+    def __init__(self, max_bytes=64 * 2 ** 20, ttl=60):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.revalidations = self.evictions = self.bytes_saved = 0
+
+    def lookup(self, url):
+        """Return (entry, fresh) for `url`, entry is None on a miss."""
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry is None:
+                self.misses += 1
+                return None, False
+            self.entries.move_to_end(url)
+            if time.monotonic() - entry.stored_at < self.ttl:
+                self.hits += 1
+                self.bytes_saved += len(entry.body)
+                return entry, True
+            return entry, False
+
+    def store(self, url, entry):
+        with self.lock:
+            old = self.entries.pop(url, None)
+            if old is not None:
+                self.size -= len(old.body)
+            if len(entry.body) > self.max_bytes:
+                return
+            self.entries[url] = entry
+            self.size += len(entry.body)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted.body)
+                self.evictions += 1
+
+    def revalidated(self, entry):
+        with self.lock:
+            entry.stored_at = time.monotonic()
+            self.revalidations += 1
+            self.bytes_saved += len(entry.body)
+
+    def cache_info(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'revalidations': self.revalidations,
+                    'evictions': self.evictions, 'bytes_saved': self.bytes_saved,
+                    'entries': len(self.entries), 'bytes': self.size, 'max_bytes': self.max_bytes}
 
 
 class URLFetcher(metaclass=SingletonType):
+    # idle keep-alive connections kept per (scheme, host, port)
+    max_idle_per_host = 16
+    timeout = 10
+    # most recent successfully fetched URLs kept in self.urls
+    max_history = 1000
+    # same limit as urllib's HTTPRedirectHandler
+    max_redirects = 10
+
     def __init__(self):
-        self.urls = []
+        self.urls = deque(maxlen=self.max_history)
+        self.cache = ResponseCache()
+        self._pool = dict()
+        self._pool_lock = threading.Lock()
 
     def fetch(self, url):
-        req = urllib.request.Request(url)
-        with urllib.request.urlopen(req) as res:
-            if res.code == 200:
-                the_page = res.read()
-                print(the_page)
-                urls = self.urls
-                urls.append(url)
-                self.urls = urls
+        """GET `url` over a pooled keep-alive connection and return a FetchResult.
+
+        Fresh cached responses are returned without a request, stale ones are
+        revalidated and a 304 answer returns the cached body. Redirects are
+        followed like urlopen does, the result carries the final URL.
+        """
+        for _ in range(self.max_redirects + 1):
+            key, target = _split_url(url)
+            cached, fresh = self.cache.lookup(url)
+            if fresh:
+                return FetchResult(url, 200, cached.body, None)
+
+            headers = dict()
+            if cached is not None:
+                if cached.etag:
+                    headers['If-None-Match'] = cached.etag
+                if cached.last_modified:
+                    headers['If-Modified-Since'] = cached.last_modified
+
+            res, body = self._exchange(key, target, headers)
+            location = res.getheader('Location')
+            if res.status in REDIRECT_STATUSES and location:
+                url = urllib.parse.urljoin(url, location)
+                continue
+
+            if res.status == 304 and cached is not None:
+                self.cache.revalidated(cached)
+                return FetchResult(url, 200, cached.body, None)
+
+            if res.status == 200:
+                self.urls.append(url)
+                if 'no-store' not in (res.getheader('Cache-Control') or ''):
+                    self.cache.store(url, CachedResponse(body, res.getheader('ETag'), res.getheader('Last-Modified')))
+            return FetchResult(url, res.status, body, None)
+        raise http.client.HTTPException(f'Too many redirects fetching {url}')
+
+    def fetch_to(self, url, sink, chunk_size=64 * 1024, progress=None):
+        """Stream the body of `url` into `sink` without holding it in memory.
+
+        `sink` is a file path, an object with write() or a callable taking
+        each chunk as a memoryview (only valid during the call). Chunks are
+        read with readinto into one reused buffer. `progress(done, total)`
+        is called after every chunk, `total` is None without Content-Length.
+        Streamed responses bypass the response cache. Redirects are followed
+        as in fetch().
+        """
+        start = time.perf_counter()
+        for _ in range(self.max_redirects + 1):
+            key, target = _split_url(url)
+            conn, res = self._open_response(key, target, dict())
+            location = res.getheader('Location')
+            if res.status not in REDIRECT_STATUSES or not location:
+                break
+            self._finish(key, conn, res)
+            url = urllib.parse.urljoin(url, location)
+        else:
+            raise http.client.HTTPException(f'Too many redirects fetching {url}')
+        done = 0
+        try:
+            if res.status != 200:
+                conn.close()
+                return DownloadResult(url, res.status, 0, time.perf_counter() - start, 0.0)
+
+            length = res.getheader('Content-Length')
+            total = int(length) if length is not None else None
+            buffer = memoryview(bytearray(chunk_size))
+            with _open_sink(sink) as write:
+                while True:
+                    n = res.readinto(buffer)
+                    if not n:
+                        break
+                    write(buffer[:n])
+                    done += n
+                    if progress is not None:
+                        progress(done, total)
+        except BaseException:
+            conn.close()
+            raise
+
+        if res.will_close:
+            conn.close()
+        else:
+            self._release(key, conn)
+        self.urls.append(url)
+        seconds = time.perf_counter() - start
+        return DownloadResult(url, res.status, done, seconds, done / seconds if seconds else 0.0)
+
+    def fetch_many(self, urls, concurrency=8):
+        """Fetch `urls` on `concurrency` threads and return their FetchResults in order.
+
+        Failures are returned as results carrying the exception instead of
+        being raised.
+        """
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            return list(pool.map(self._fetch_captured, urls))
+
+    def close(self):
+        with self._pool_lock:
+            idle, self._pool = self._pool, dict()
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+    def _fetch_captured(self, url):
+        try:
+            return self.fetch(url)
+        except Exception as e:
+            return FetchResult(url, None, None, e)
+
+    def _exchange(self, key, target, headers):
+        conn, res = self._open_response(key, target, headers)
+        return res, self._finish(key, conn, res)
+
+    def _finish(self, key, conn, res):
+        """Read the rest of `res` and give its connection back to the pool."""
+        try:
+            body = res.read()
+        except BaseException:
+            conn.close()
+            raise
+        if res.will_close:
+            conn.close()
+        else:
+            self._release(key, conn)
+        return body
+
+    def _open_response(self, key, target, headers):
+        conn, reused = self._acquire(key)
+        try:
+            return conn, self._request(conn, target, headers)
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            if not reused:
+                raise
+        # the server dropped an idle connection, retry once on a fresh one
+        conn, _ = self._acquire(key, fresh=True)
+        return conn, self._request(conn, target, headers)
+
+    def _request(self, conn, target, headers):
+        try:
+            conn.request('GET', target, headers=headers)
+            return conn.getresponse()
+        except BaseException:
+            conn.close()
+            raise
+
+    def _acquire(self, key, fresh=False):
+        if not fresh:
+            with self._pool_lock:
+                idle = self._pool.get(key)
+                if idle:
+                    return idle.pop(), True
+        scheme, host, port = key
+        connection = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        return connection(host, port, timeout=self.timeout), False
+
+    def _release(self, key, conn):
+        with self._pool_lock:
+            idle = self._pool.setdefault(key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+
+def _split_url(url):
+    """Return the pool key and request target of an http(s) URL."""
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in ('http', 'https'):
+        raise ValueError(f'Cannot fetch {url}')
+    key = (parts.scheme, parts.hostname, parts.port)
+    target = urllib.parse.urlunsplit(('', '', parts.path or '/', parts.query, ''))
+    return key, target
+
+
+@contextlib.contextmanager
+def _open_sink(sink):
+    """Turn a download sink into a write(chunk) callable."""
+    if isinstance(sink, (str, bytes, os.PathLike)):
+        with open(sink, mode='wb') as f:
+            yield f.write
+    elif callable(sink):
+        yield sink
+    else:
+        yield sink.write
 
 
 if __name__ == "__main__":
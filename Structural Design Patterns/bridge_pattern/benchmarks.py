@@ -0,0 +1,126 @@
+"""
+Benchmarks for the bridge pattern fetchers
+------------------------------------------
+Each measurement runs in a fresh process so that the peak RSS reported
+belongs to that code path alone, and every path feeds the whole file to
+md5 so that they do the same work. Mapped pages of fetch_view count
+towards RSS but are clean page cache the kernel can drop at any time.
+
+Usage: python benchmarks.py [file size in MB] [URLs]
+"""
+import hashlib
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bridge_pattern import AsyncResourceContentFetcher, LocalFileFetcher, ResourceContent
+
+
+class HashSink:
+    def __init__(self):
+        self.md5 = hashlib.md5()
+
+    def write(self, chunk):
+        self.md5.update(chunk)
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+    """Answers after `delay` seconds to stand in for a remote server."""
+    delay = 0.02
+    body = b'x' * 1024
+
+    def do_GET(self):
+        time.sleep(self.delay)
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_in_fresh_process(fn, *args):
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+        return pool.submit(fn, *args).result()
+
+
+def read_text(path):
+    start = time.perf_counter()
+    hashlib.md5(LocalFileFetcher().fetch(path).encode()).digest()
+    return time.perf_counter() - start, peak_rss_mb()
+
+
+def hash_view(path):
+    start = time.perf_counter()
+    hashlib.md5(LocalFileFetcher().fetch_view(path)).digest()
+    return time.perf_counter() - start, peak_rss_mb()
+
+
+def stream_to_sink(path):
+    start = time.perf_counter()
+    sink = HashSink()
+    ResourceContent(LocalFileFetcher()).stream_content(path, sink)
+    sink.md5.digest()
+    return time.perf_counter() - start, peak_rss_mb()
+
+
+def bench_local_file(size_mb):
+    with tempfile.NamedTemporaryFile(suffix='.log', delete=False) as f:
+        line = b'2020-10-05 12:00:00 INFO bridge pattern log line\n'
+        block = line * (2 ** 20 // len(line))
+        for _ in range(size_mb):
+            f.write(block)
+        path = f.name
+    try:
+        size_gb = os.path.getsize(path) / 2 ** 30
+        print(f'LocalFileFetcher over a {size_mb} MB file')
+        for name, fn in (('fetch (text)', read_text), ('fetch_view', hash_view),
+                         ('stream_content', stream_to_sink)):
+            elapsed, rss = run_in_fresh_process(fn, path)
+            print(f'  {name:<17} {size_gb / elapsed:>6.2f} GB/s  peak RSS {rss:.1f} MB')
+    finally:
+        os.remove(path)
+
+
+def bench_fetch_all(urls):
+    server = LocalServer(('127.0.0.1', 0), SlowHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    paths = [f'http://127.0.0.1:{server.server_port}/page/{i}' for i in range(urls)]
+    iface = ResourceContent(AsyncResourceContentFetcher())
+    print(f'fetch_all: {urls} URLs, {SlowHandler.delay * 1e3:.0f} ms server latency')
+    baseline = None
+    for limit in (1, 10, 50, 100):
+        start = time.perf_counter()
+        results = iface.fetch_all(paths, limit=limit)
+        elapsed = time.perf_counter() - start
+        failed = sum(result != SlowHandler.body for result in results)
+        baseline = baseline or elapsed
+        print(f'  limit={limit:<4} {urls / elapsed:>8.0f} req/s  speedup {baseline / elapsed:>5.1f}x  failed={failed}')
+    server.shutdown()
+
+
+def main():
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 512
+    bench_local_file(size_mb)
+    bench_fetch_all(int(sys.argv[2]) if len(sys.argv) > 2 else 1000)
+
+
+if __name__ == '__main__':
+    main()
@@ -10,7 +10,16 @@ Use cases
     1. By defining an abstraction that applies to all classes
     2. By defining a separate interface for the different objects involved
 """
-from urllib import request
+import asyncio
+import hashlib
+import mmap
+import os
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+from urllib import parse, request
 from abc import ABC, ABCMeta, abstractmethod
 
 
@@ -26,6 +35,32 @@ class ResourceContent(ABC):
     def show_content(self, path):
         print(self._implementation.fetch(path))
 
+    def stream_content(self, path, sink=None):
+        """Copy the resource into the binary `sink` chunk by chunk, stdout by default."""
+        sink = sink if sink is not None else sys.stdout.buffer
+        for chunk in self._implementation.iter_chunks(path):
+            sink.write(chunk)
+
+    def fetch_all(self, paths, limit=10):
+        """Fetch every path with at most `limit` fetches in flight.
+
+        Returns the contents in the order of `paths`, a failed fetch is
+        returned as its exception.
+        """
+        return asyncio.run(self.fetch_all_async(paths, limit))
+
+    async def fetch_all_async(self, paths, limit=10):
+        semaphore = asyncio.Semaphore(limit)
+        fetch_async = getattr(self._implementation, 'fetch_async', None)
+
+        async def fetch_one(path):
+            async with semaphore:
+                if fetch_async is not None:
+                    return await fetch_async(path)
+                return await asyncio.to_thread(self._implementation.fetch, path)
+
+        return await asyncio.gather(*(fetch_one(path) for path in paths), return_exceptions=True)
+
 
 class ResourceContentFetcher(metaclass=ABCMeta):
 
@@ -33,6 +68,11 @@ class ResourceContentFetcher(metaclass=ABCMeta):
     def fetch(self, path):
         pass
 
+    def iter_chunks(self, path, chunk_size=1024 * 1024):
+        """Yield the resource as bytes chunks, implementors that can stream override this."""
+        content = self.fetch(path)
+        yield content.encode() if isinstance(content, str) else content
+
 
 class URLFetcher(ResourceContentFetcher):
 
@@ -43,6 +83,13 @@ class URLFetcher(ResourceContentFetcher):
                 the_page = res.read()
                 return the_page
 
+    def iter_chunks(self, path, chunk_size=1024 * 1024):
+        req = request.Request(path)
+        with request.urlopen(req) as res:
+            if res.code == 200:
+                while chunk := res.read(chunk_size):
+                    yield chunk
+
 
 class LocalFileFetcher(ResourceContentFetcher):
 
@@ -50,6 +97,380 @@ class LocalFileFetcher(ResourceContentFetcher):
         with open(path) as f:
             return f.read()
 
+    def fetch_view(self, path, start=0, end=None):
+        """Return bytes [start, end) of the file as a zero-copy memoryview over an mmap."""
+        with open(path, mode='rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return memoryview(b'')
+            # the mapping stays valid after the file is closed and lives as long as the view
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(mapped)[start:end]
+
+    def iter_chunks(self, path, chunk_size=1024 * 1024, start=0, end=None):
+        """Yield bytes [start, end) of the file in chunks of at most `chunk_size` bytes."""
+        with open(path, mode='rb') as f:
+            f.seek(start)
+            remaining = float('inf') if end is None else end - start
+            while remaining > 0:
+                chunk = f.read(int(min(chunk_size, remaining)))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+
+class AsyncResourceContentFetcher(ResourceContentFetcher):
+    """Fetches URLs over raw asyncio streams and local files on a worker thread.
+
+    Redirects are followed like urlopen does, up to `max_redirects` hops.
+    A URL fetch that takes longer than `timeout` seconds in all raises
+    TimeoutError, a body larger than `max_body_size` bytes raises ValueError.
+    """
+    timeout = 10
+    max_body_size = 64 * 2 ** 20
+    # same limit as urllib's HTTPRedirectHandler
+    max_redirects = 10
+    redirect_statuses = frozenset((301, 302, 303, 307, 308))
+
+    def fetch(self, path):
+        return asyncio.run(self.fetch_async(path))
+
+    async def fetch_async(self, path):
+        if parse.urlsplit(path).scheme in ('http', 'https'):
+            return await asyncio.wait_for(self._fetch_url(path), self.timeout)
+        return await asyncio.to_thread(self._read_file, path)
+
+    @staticmethod
+    def _read_file(path):
+        with open(path) as f:
+            return f.read()
+
+    async def _fetch_url(self, url):
+        for _ in range(self.max_redirects + 1):
+            status, headers, body = await self._get(url)
+            if status in self.redirect_statuses and 'location' in headers:
+                url = parse.urljoin(url, headers['location'])
+                if parse.urlsplit(url).scheme not in ('http', 'https'):
+                    raise ValueError(f'Cannot follow a redirect to {url}')
+                continue
+            if status == 200:
+                return body
+            return None
+        raise ValueError(f'Too many redirects fetching {url}')
+
+    async def _get(self, url):
+        """GET `url` on a new connection and return (status, headers, body)."""
+        parts = parse.urlsplit(url)
+        https = parts.scheme == 'https'
+        port = parts.port or (443 if https else 80)
+        target = parse.urlunsplit(('', '', parts.path or '/', parts.query, ''))
+        # the netloc may carry user:password@, which must not go out in Host
+        host = f'[{parts.hostname}]' if ':' in parts.hostname else parts.hostname
+        if parts.port is not None:
+            host = f'{host}:{parts.port}'
+
+        reader, writer = await asyncio.open_connection(parts.hostname, port, ssl=True if https else None)
+        try:
+            writer.write(f'GET {target} HTTP/1.1\r\nHost: {host}\r\n'
+                         f'Connection: close\r\n\r\n'.encode('latin-1'))
+            await writer.drain()
+
+            status = int((await reader.readline()).split()[1])
+            headers = dict()
+            while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            if 'chunked' in headers.get('transfer-encoding', '').lower():
+                body = await self._read_chunked(reader, self.max_body_size)
+            elif 'content-length' in headers:
+                length = int(headers['content-length'])
+                if length > self.max_body_size:
+                    raise ValueError(f'{url} body of {length} bytes exceeds {self.max_body_size}')
+                body = await reader.readexactly(length)
+            else:
+                chunks = bytearray()
+                while chunk := await reader.read(64 * 1024):
+                    chunks += chunk
+                    if len(chunks) > self.max_body_size:
+                        raise ValueError(f'{url} body exceeds {self.max_body_size} bytes')
+                body = bytes(chunks)
+        finally:
+            writer.close()
+        return status, headers, body
+
+    @staticmethod
+    async def _read_chunked(reader, max_size):
+        chunks = []
+        total = 0
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            total += size
+            if total > max_size:
+                raise ValueError(f'Chunked body exceeds {max_size} bytes')
+            if size == 0:
+                # skip the trailer section
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                return b''.join(chunks)
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+
+
+class CachedContent:
+    def __init__(self, content, stored_at):
+        self.content = content
+        self.stored_at = stored_at
+        self.size = len(content)
+
+
+class CachingResourceContentFetcher(ResourceContentFetcher):
+    """Wraps another implementor with a memory tier and an optional disk tier.
+
+    The memory tier is an LRU bounded by `max_bytes`. The disk tier in
+    `cache_dir` stores each content once under its sha256 digest. Once its
+    objects exceed `max_disk_bytes`, unreferenced objects are deleted and
+    the least recently stored paths are evicted. Content younger than
+    `ttl` seconds is served as is; up to `stale_ttl` seconds later it is
+    still served while a background fetch refreshes it. Concurrent misses
+    for the same path share a single fetch. Disk errors, including
+    unreadable or corrupt entries, are counted as 'disk_error' and never
+    fail a fetch.
+    """
+    # upper bounds, in seconds, of the latency histogram buckets
+    latency_buckets = (0.0001, 0.001, 0.01, 0.1, 1.0, float('inf'))
+
+    def __init__(self, implementation, max_bytes=64 * 2 ** 20, cache_dir=None, ttl=60, stale_ttl=300,
+                 max_disk_bytes=256 * 2 ** 20):
+        self._implementation = implementation
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.size = 0
+        self.entries = OrderedDict()
+        self.inflight = dict()
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.histograms = dict()
+        # bytes of the objects on disk, estimated between collections
+        self.disk_size = 0
+        self.disk_lock = threading.Lock()
+        if cache_dir is not None:
+            os.makedirs(os.path.join(cache_dir, 'objects'), exist_ok=True)
+            os.makedirs(os.path.join(cache_dir, 'refs'), exist_ok=True)
+            self.disk_size = sum(size for _, size in self._scan_objects())
+
+    def fetch(self, path):
+        start = time.perf_counter()
+        content, outcome = self._lookup(path)
+        self._record(outcome, time.perf_counter() - start)
+        return content
+
+    def stats(self):
+        with self.lock:
+            counts = dict(self.counts)
+            histograms = {outcome: dict(zip(self.latency_buckets, buckets))
+                          for outcome, buckets in self.histograms.items()}
+        lookups = sum(counts.get(outcome, 0) for outcome in ('memory_hit', 'disk_hit', 'stale_hit', 'coalesced', 'miss'))
+        hits = lookups - counts.get('miss', 0)
+        return {'hit_rate': hits / lookups if lookups else 0.0, 'counts': counts,
+                'latency_histograms': histograms, 'bytes': self.size, 'entries': len(self.entries)}
+
+    def _lookup(self, path):
+        outcome = 'memory_hit'
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None:
+                self.entries.move_to_end(path)
+        if entry is None and self.cache_dir is not None:
+            entry = self._load_from_disk(path)
+            if entry is not None:
+                outcome = 'disk_hit'
+                self._store_in_memory(path, entry)
+
+        if entry is not None:
+            age = time.time() - entry.stored_at
+            if age < self.ttl:
+                return entry.content, outcome
+            if age < self.ttl + self.stale_ttl:
+                self._refresh_in_background(path)
+                return entry.content, 'stale_hit'
+
+        future, leader = self._claim(path)
+        if not leader:
+            return future.result(), 'coalesced'
+        return self._fetch_into(path, future), 'miss'
+
+    def _claim(self, path):
+        with self.lock:
+            future = self.inflight.get(path)
+            if future is not None:
+                return future, False
+            future = self.inflight[path] = Future()
+            return future, True
+
+    def _fetch_into(self, path, future):
+        try:
+            content = self._implementation.fetch(path)
+            if content is not None:
+                self._store(path, content)
+            future.set_result(content)
+            return content
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.inflight[path]
+
+    def _refresh_in_background(self, path):
+        future, leader = self._claim(path)
+        if not leader:
+            return
+
+        def refresh():
+            try:
+                self._fetch_into(path, future)
+            except Exception:
+                with self.lock:
+                    self.counts['refresh_error'] += 1
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def _store(self, path, content):
+        entry = CachedContent(content, time.time())
+        self._store_in_memory(path, entry)
+        if self.cache_dir is not None:
+            self._save_to_disk(path, entry)
+
+    def _store_in_memory(self, path, entry):
+        with self.lock:
+            old = self.entries.pop(path, None)
+            if old is not None:
+                self.size -= old.size
+            if entry.size > self.max_bytes:
+                return
+            self.entries[path] = entry
+            self.size += entry.size
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= evicted.size
+                self.counts['eviction'] += 1
+
+    def _ref_path(self, path):
+        return os.path.join(self.cache_dir, 'refs', hashlib.sha256(path.encode()).hexdigest())
+
+    def _save_to_disk(self, path, entry):
+        is_text = isinstance(entry.content, str)
+        data = entry.content.encode() if is_text else entry.content
+        digest = hashlib.sha256(data).hexdigest()
+        object_path = os.path.join(self.cache_dir, 'objects', digest)
+        ref = f"{digest} {'str' if is_text else 'bytes'} {entry.stored_at!r}"
+        try:
+            with self.disk_lock:
+                if not os.path.exists(object_path):
+                    _write_atomically(object_path, data)
+                    self.disk_size += len(data)
+                _write_atomically(self._ref_path(path), ref.encode())
+                if self.disk_size > self.max_disk_bytes:
+                    self._collect_disk()
+        except OSError:
+            # the disk tier is best effort, e.g. for a full or read-only disk
+            with self.lock:
+                self.counts['disk_error'] += 1
+
+    def _load_from_disk(self, path):
+        try:
+            with open(self._ref_path(path), mode='rb') as f:
+                digest, kind, stored_at = f.read().decode().split()
+            with open(os.path.join(self.cache_dir, 'objects', digest), mode='rb') as f:
+                data = f.read()
+            return CachedContent(data.decode() if kind == 'str' else data, float(stored_at))
+        except FileNotFoundError:
+            # never stored, or evicted by a collection
+            return None
+        except Exception:
+            with self.lock:
+                self.counts['disk_error'] += 1
+            return None
+
+    def _scan_objects(self):
+        """Yield (digest, size) of every object on disk."""
+        with os.scandir(os.path.join(self.cache_dir, 'objects')) as entries:
+            for entry in entries:
+                if not entry.name.endswith('.tmp'):
+                    yield entry.name, entry.stat().st_size
+
+    def _collect_disk(self):
+        """Delete unreferenced objects, then evict the least recently stored
+        refs until the objects fit in three quarters of `max_disk_bytes`, so
+        that collections do not run on every save. Runs under disk_lock."""
+        refs = []  # (stored at, ref path, digest)
+        with os.scandir(os.path.join(self.cache_dir, 'refs')) as entries:
+            for entry in entries:
+                if entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    with open(entry.path, mode='rb') as f:
+                        refs.append((entry.stat().st_mtime, entry.path, f.read().split()[0].decode()))
+                except (OSError, ValueError, IndexError):
+                    # a corrupt ref can never be loaded
+                    _remove_quietly(entry.path)
+        users = Counter(digest for _, _, digest in refs)
+
+        sizes = dict()
+        for digest, size in self._scan_objects():
+            if digest in users:
+                sizes[digest] = size
+            else:
+                _remove_quietly(os.path.join(self.cache_dir, 'objects', digest))
+        total = sum(sizes.values())
+
+        refs.sort()
+        evicted = 0
+        for _, ref_path, digest in refs:
+            if total <= self.max_disk_bytes * 3 // 4:
+                break
+            _remove_quietly(ref_path)
+            evicted += 1
+            users[digest] -= 1
+            if not users[digest] and digest in sizes:
+                _remove_quietly(os.path.join(self.cache_dir, 'objects', digest))
+                total -= sizes.pop(digest)
+        self.disk_size = total
+        with self.lock:
+            self.counts['disk_eviction'] += evicted
+
+    def _record(self, outcome, seconds):
+        with self.lock:
+            self.counts[outcome] += 1
+            buckets = self.histograms.setdefault(outcome, [0] * len(self.latency_buckets))
+            for i, bound in enumerate(self.latency_buckets):
+                if seconds <= bound:
+                    buckets[i] += 1
+                    break
+
+
+def _write_atomically(path, data):
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(tmp_path, mode='wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
 
 def main():
     url_fetcher = URLFetcher()
@@ -61,6 +482,10 @@ def main():
     iface = ResourceContent(local_file_fetcher)
     iface.show_content("file.txt")
 
+    print("=====================")
+    iface = ResourceContent(AsyncResourceContentFetcher())
+    print(iface.fetch_all(["file.txt", "http://google.com"], limit=2))
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,138 @@
+"""
+Benchmarks for the decorator pattern examples
+---------------------------------------------
+Usage: python benchmarks.py [workers] [orders]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import decorator_pattern
+from decorator_pattern import CoffeeDecorator, CoffeeOrderBatch, SimpleCoffee, WithMilk, WithSprinkles
+from memoize_decorator_pattern import memoize, shared_memoize
+
+computations = 0
+expensive = None
+
+
+def _expensive(x):
+    global computations
+    computations += 1
+    total = 0
+    for i in range(20_000):
+        total += i * x % 7
+    return total
+
+
+def _init_worker(path):
+    global expensive, computations
+    computations = 0
+    expensive = shared_memoize(path)(_expensive) if path else memoize(_expensive)
+
+
+def _run_jobs(keys):
+    for key in keys:
+        expensive(key)
+    return os.getpid(), computations
+
+
+def bench_shared_memoize(max_workers, keys=400, jobs_per_worker=4):
+    print(f'shared_memoize: every job needs the same {keys} results, {jobs_per_worker} jobs per worker')
+    for workers in sorted({1, 2, 4, max_workers} & set(range(1, max_workers + 1))):
+        jobs = [random.sample(range(keys), keys) for _ in range(workers * jobs_per_worker)]
+        for label in ('per-process memoize', 'shared_memoize'):
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, 'memo.table') if label == 'shared_memoize' else None
+                start = time.perf_counter()
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(path,)) as pool:
+                    per_worker = dict()
+                    for pid, count in pool.map(_run_jobs, jobs):
+                        per_worker[pid] = max(count, per_worker.get(pid, 0))
+                elapsed = time.perf_counter() - start
+            print(f'  workers={workers:<3} {label:<20} {elapsed:>7.2f} s  '
+                  f'computations={sum(per_worker.values())}')
+
+
+class RecursiveMilk(CoffeeDecorator):
+    """The original per-layer recursive decorator, kept for comparison."""
+
+    def get_cost(self):
+        return self._decorated_coffee.get_cost() + 0.5
+
+    def get_ingredients(self):
+        return self._decorated_coffee.get_ingredients() + ", with Milk"
+
+
+class RecursiveSprinkles(RecursiveMilk):
+    def get_cost(self):
+        return self._decorated_coffee.get_cost() + 0.2
+
+    def get_ingredients(self):
+        return self._decorated_coffee.get_ingredients() + ", with Sprinkles"
+
+
+def build(depth, milk, sprinkles):
+    coffee = SimpleCoffee()
+    for i in range(depth):
+        coffee = milk(coffee) if i % 2 else sprinkles(coffee)
+    return coffee
+
+
+def bench_coffee_depth(depths=(10, 1_000, 100_000)):
+    print('Coffee decorator stacks: build + first evaluation, then a repeat evaluation')
+    for depth in depths:
+        for label, milk, sprinkles in (('recursive', RecursiveMilk, RecursiveSprinkles),
+                                       ('flattened', WithMilk, WithSprinkles)):
+            start = time.perf_counter()
+            coffee = build(depth, milk, sprinkles)
+            try:
+                coffee.get_cost(), coffee.get_ingredients()
+            except RecursionError:
+                print(f'  depth={depth:<7} {label:<10} RecursionError')
+                continue
+            cold = time.perf_counter() - start
+            start = time.perf_counter()
+            coffee.get_cost(), coffee.get_ingredients()
+            warm = time.perf_counter() - start
+            print(f'  depth={depth:<7} {label:<10} {cold * 1e3:>10.3f} ms cold  {warm * 1e6:>10.1f} us again')
+
+
+def bench_batch_pricing(orders):
+    rnd = random.Random(42)
+    counts = [[rnd.randint(0, 3), rnd.randint(0, 3)] for _ in range(orders)]
+    coffees = []
+    for milk, sprinkles in counts:
+        coffee = SimpleCoffee()
+        for _ in range(milk):
+            coffee = WithMilk(coffee)
+        for _ in range(sprinkles):
+            coffee = WithSprinkles(coffee)
+        coffees.append(coffee)
+
+    engine = 'NumPy' if decorator_pattern.numpy is not None else 'pure Python fallback'
+    print(f'Batch pricing: {orders:,} orders ({engine})')
+    start = time.perf_counter()
+    object_costs = [coffee.get_cost() for coffee in coffees]
+    objects = time.perf_counter() - start
+
+    batch = CoffeeOrderBatch(counts)
+    start = time.perf_counter()
+    batch_costs = batch.costs()
+    vectorized = time.perf_counter() - start
+    worst = max(abs(a - b) for a, b in zip(object_costs, batch_costs))
+    print(f'  object graph  {orders / objects:>14,.0f} orders/s')
+    print(f'  batch         {orders / vectorized:>14,.0f} orders/s  max difference {worst:.1e}')
+
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count() or 1
+    bench_coffee_depth()
+    bench_batch_pricing(int(sys.argv[2]) if len(sys.argv) > 2 else 1_000_000)
+    bench_shared_memoize(workers)
+
+
+if __name__ == '__main__':
+    main()
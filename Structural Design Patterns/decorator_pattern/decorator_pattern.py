@@ -1,5 +1,11 @@
+import array
 from abc import ABC, abstractmethod
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 class Coffee(ABC):
     @abstractmethod
@@ -23,44 +29,140 @@ class SimpleCoffee(Coffee):
 
 
 class CoffeeDecorator(Coffee):
+    """Adds `extra_cost` and `extra_ingredients` to the decorated coffee.
+
+    A stack of decorators is evaluated in one loop over its layers instead
+    of one recursive call per layer. Only the list of layers is cached, on
+    the decorator it was asked on; re-pointing any layer at another coffee
+    invalidates every cached list. Costs, ingredients and the base coffee
+    are read afresh on each call, so changes to them are never missed.
+    """
+    extra_cost = 0
+    extra_ingredients = ''
+    # bumped whenever a layer is re-pointed, cached layer lists of older generations are stale
+    _generation = 0
+
     def __init__(self, c):
-        self._decorated_coffee = c
+        self._coffee = c
+        self._cache = None
+
+    def __setattr__(self, name, value):
+        # a layer being built is not part of any stack yet, only re-pointing one can stale a cache
+        if name == '_coffee' and '_coffee' in self.__dict__:
+            CoffeeDecorator._generation += 1
+        super().__setattr__(name, value)
+
+    @property
+    def _decorated_coffee(self):
+        return self._coffee
+
+    @_decorated_coffee.setter
+    def _decorated_coffee(self, c):
+        self._coffee = c
 
     def get_cost(self):
-        return self._decorated_coffee.get_cost()
+        layers, c = self._flatten()
+        cost = c.get_cost()
+        for layer in layers:
+            cost += layer.extra_cost
+        return cost
 
     def get_ingredients(self):
-        return self._decorated_coffee.get_ingredients()
+        layers, c = self._flatten()
+        return ''.join([c.get_ingredients()] + [layer.extra_ingredients for layer in layers])
+
+    def _flatten(self):
+        """Return the layers that simply add their extras, innermost first,
+        and the coffee below them."""
+        cache = self._cache
+        if cache is not None and cache[0] == CoffeeDecorator._generation:
+            return cache[1]
+
+        layers = [self]
+        c = self._coffee
+        # walk down to the first coffee that does not simply add its extras
+        while (isinstance(c, CoffeeDecorator) and type(c).get_cost is CoffeeDecorator.get_cost
+               and type(c).get_ingredients is CoffeeDecorator.get_ingredients):
+            layers.append(c)
+            c = c._coffee
+        layers.reverse()
+
+        result = (layers, c)
+        self._cache = (CoffeeDecorator._generation, result)
+        return result
 
 
 class WithMilk(CoffeeDecorator):
+    extra_cost = 0.5
+    extra_ingredients = ", with Milk"
+
     def __init__(self, c):
         super().__init__(c)
 
-    def get_cost(self):
-        return super().get_cost() + 0.5
-
-    def get_ingredients(self):
-        return super().get_ingredients() + ", with Milk"
-
     def __str__(self) -> str:
         return f"Cost: {self.get_cost()}; Ingredients: {self.get_ingredients()}"
 
 
 class WithSprinkles(CoffeeDecorator):
+    extra_cost = 0.2
+    extra_ingredients = ", with Sprinkles"
+
     def __init__(self, c):
         super().__init__(c)
 
-    def get_cost(self):
-        return super().get_cost() + 0.2
-
-    def get_ingredients(self):
-        return super().get_ingredients() + ", with Sprinkles"
-
     def __str__(self) -> str:
         return f"Cost: {self.get_cost()}; Ingredients: {self.get_ingredients()}"
 
 
+class CoffeeOrderBatch:
+    """Prices many orders at once from an encoded form instead of decorator objects.
+
+    Each order is a base index into `bases` plus how many of each of
+    `addons` it has, so prices stay defined on the classes themselves.
+    Costs are computed in one NumPy pass when NumPy is installed and in a
+    plain loop otherwise. Ingredient strings are only built on request and
+    list the add-ons in the order of `addons`.
+    """
+    bases = (SimpleCoffee,)
+    addons = (WithMilk, WithSprinkles)
+
+    def __init__(self, counts, base_ids=None):
+        self.counts = counts
+        self.base_ids = base_ids if base_ids is not None else [0] * len(counts)
+
+    @classmethod
+    def encode(cls, coffee):
+        """Return (base_id, counts) for a decorator stack built from `bases` and `addons`."""
+        counts = [0] * len(cls.addons)
+        while isinstance(coffee, CoffeeDecorator):
+            counts[cls.addons.index(type(coffee))] += 1
+            coffee = coffee._decorated_coffee
+        return cls.bases.index(type(coffee)), counts
+
+    @classmethod
+    def from_coffees(cls, coffees):
+        encoded = [cls.encode(coffee) for coffee in coffees]
+        return cls([counts for _, counts in encoded], [base_id for base_id, _ in encoded])
+
+    def costs(self):
+        base_costs = [base().get_cost() for base in self.bases]
+        prices = [addon.extra_cost for addon in self.addons]
+        if numpy is not None:
+            counts = numpy.asarray(self.counts, dtype=numpy.float64).reshape(-1, len(prices))
+            return numpy.asarray(base_costs)[numpy.asarray(self.base_ids, dtype=numpy.intp)] + counts @ numpy.asarray(prices)
+        return array.array('d', (base_costs[base_id] + sum(n * price for n, price in zip(counts, prices))
+                                 for base_id, counts in zip(self.base_ids, self.counts)))
+
+    def ingredients(self, i):
+        parts = [self.bases[self.base_ids[i]]().get_ingredients()]
+        for addon, n in zip(self.addons, self.counts[i]):
+            parts.extend([addon.extra_ingredients] * int(n))
+        return ''.join(parts)
+
+    def __len__(self):
+        return len(self.counts)
+
+
 if __name__ == "__main__":
     sc = SimpleCoffee()
     print(sc)
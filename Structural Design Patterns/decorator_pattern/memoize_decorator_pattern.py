@@ -1,12 +1,327 @@
-def memoize(fn):
-    cache = {}
+import asyncio
+import functools
+import hashlib
+import marshal
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+from collections import OrderedDict, namedtuple
 
-    def memoized(n):
-        if cache.get(n) is None:
-            cache[n] = fn(n)
-        return cache[n]
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+CacheInfo = namedtuple('CacheInfo', 'hits misses maxsize currsize')
+
+_MISSING = object()
+_KWARGS_MARK = object()
+_FAST_TYPES = {int, str}
+
+
+def make_key(args, kwargs, typed=False):
+    """Build a hashable cache key from a call's args and kwargs."""
+    if not kwargs and not typed and len(args) == 1 and type(args[0]) in _FAST_TYPES:
+        return args[0]
+    key = args
+    if kwargs:
+        key += (_KWARGS_MARK,) + tuple(sorted(kwargs.items()))
+    if typed:
+        key += tuple(type(arg) for arg in args)
+        if kwargs:
+            key += tuple(type(value) for _, value in sorted(kwargs.items()))
+    return key
+
+
+def memoize(fn=None, *, maxsize=None, ttl=None, typed=False, key=None):
+    """Cache the results of `fn`, usable as @memoize or @memoize(maxsize=...).
+
+    maxsize bounds the cache with LRU eviction (None is unbounded), ttl
+    expires entries after that many seconds, typed caches f(1) and f(1.0)
+    separately and key replaces the key function, it is called with the
+    same arguments as `fn`. None results are cached like any other value.
+    The cache is guarded by a lock, which is not held while `fn` runs, so
+    a racing miss may compute the same value twice.
+    """
+    if fn is None:
+        return functools.partial(memoize, maxsize=maxsize, ttl=ttl, typed=typed, key=key)
+
+    cache = OrderedDict()
+    lock = threading.Lock()
+    stats = [0, 0]  # hits, misses
+
+    def memoized(*args, **kwargs):
+        k = key(*args, **kwargs) if key is not None else make_key(args, kwargs, typed)
+        with lock:
+            entry = cache.get(k, _MISSING)
+            if entry is not _MISSING:
+                value, expires_at = entry
+                if expires_at is None or time.monotonic() < expires_at:
+                    if maxsize is not None:
+                        cache.move_to_end(k)
+                    stats[0] += 1
+                    return value
+                del cache[k]
+            stats[1] += 1
+
+        value = fn(*args, **kwargs)
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+
+        with lock:
+            cache[k] = (value, expires_at)
+            if maxsize is not None:
+                cache.move_to_end(k)
+                while len(cache) > maxsize:
+                    cache.popitem(last=False)
+        return value
+
+    def cache_info():
+        with lock:
+            return CacheInfo(stats[0], stats[1], maxsize, len(cache))
+
+    def cache_clear():
+        with lock:
+            cache.clear()
+            stats[:] = [0, 0]
+
+    memoized.cache_info = cache_info
+    memoized.cache_clear = cache_clear
+    return functools.update_wrapper(memoized, fn)
+
+
+def async_memoize(fn=None, *, maxsize=None, ttl=None, typed=False, key=None, error_ttl=None):
+    """Cache the results of the coroutine function `fn` with single-flight misses.
+
+    Concurrent calls for a key that is being computed await the same task
+    instead of starting their own, so a stampede costs one computation.
+    Exceptions are cached for `error_ttl` seconds, None does not cache
+    them. Callers await the task through asyncio.shield, cancelling one
+    caller does not cancel the computation the others are waiting for.
+    Other options work as in memoize; the cache belongs to one event loop.
+    """
+    if fn is None:
+        return functools.partial(async_memoize, maxsize=maxsize, ttl=ttl, typed=typed, key=key,
+                                 error_ttl=error_ttl)
+
+    cache = OrderedDict()
+    inflight = dict()
+    stats = [0, 0]  # hits, misses
+
+    def store(k, task):
+        del inflight[k]
+        if task.cancelled():
+            return
+        if task.exception() is None:
+            lifetime = ttl
+        elif error_ttl is not None:
+            lifetime = error_ttl
+        else:
+            return
+        cache[k] = (task, time.monotonic() + lifetime if lifetime is not None else None)
+        if maxsize is not None:
+            cache.move_to_end(k)
+            while len(cache) > maxsize:
+                cache.popitem(last=False)
+
+    async def memoized(*args, **kwargs):
+        k = key(*args, **kwargs) if key is not None else make_key(args, kwargs, typed)
+        entry = cache.get(k, _MISSING)
+        if entry is not _MISSING:
+            task, expires_at = entry
+            if expires_at is None or time.monotonic() < expires_at:
+                if maxsize is not None:
+                    cache.move_to_end(k)
+                stats[0] += 1
+                return task.result()
+            del cache[k]
+
+        task = inflight.get(k)
+        if task is None:
+            stats[1] += 1
+            task = inflight[k] = asyncio.ensure_future(fn(*args, **kwargs))
+            task.add_done_callback(functools.partial(store, k))
+        else:
+            stats[0] += 1
+        return await asyncio.shield(task)
+
+    def cache_info():
+        return CacheInfo(stats[0], stats[1], maxsize, len(cache))
+
+    def cache_clear():
+        cache.clear()
+        stats[:] = [0, 0]
+
+    memoized.cache_info = cache_info
+    memoized.cache_clear = cache_clear
+    return functools.update_wrapper(memoized, fn)
+
+
+_path_locks = dict()  # (pid, real path) -> thread lock
+_path_locks_lock = threading.Lock()
+
+
+def _path_lock(path):
+    """The one thread lock of `path` in this process.
+
+    lockf locks belong to the process, not to a file descriptor, so all
+    stores on one file in a process must also take the same thread lock.
+    """
+    key = (os.getpid(), os.path.realpath(path))
+    with _path_locks_lock:
+        lock = _path_locks.get(key)
+        if lock is None:
+            lock = _path_locks[key] = threading.Lock()
+        return lock
+
+
+class SharedMemoStore:
+    """Fixed-size open-addressing hash table of pickled results in an mmap'd file.
+
+    Every process that opens the same `path` sees the same table, so a
+    result computed by one pool worker is a hit for all the others. Each
+    slot holds one pickled (key, value) pair of at most `slot_size` bytes;
+    larger results are simply not stored. A key probes `max_probes` slots
+    and, when they are all taken, replaces the first one. Readers take a
+    shared and writers an exclusive lockf lock on the file, which also
+    holds across forked workers. A table written by another `version` of
+    this layout is emptied when it is opened.
+    """
+    magic = b'MEMOTBL1'
+    version = 2
+    max_probes = 8
+    _header = struct.Struct('<8sIII')  # magic, version, slots, slot_size
+    _slot = struct.Struct('<BQI')  # used, key hash, payload length
+
+    def __init__(self, path, slots=65536, slot_size=512):
+        if fcntl is None:
+            raise RuntimeError('SharedMemoStore needs fcntl file locking')
+        self.path = path
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        self.lock = _path_lock(path)
+        self.hits = self.misses = 0
+
+        with self.lock:
+            fcntl.lockf(self.fd, fcntl.LOCK_EX)
+            try:
+                magic, version = self._header.unpack(os.pread(self.fd, self._header.size, 0).ljust(
+                    self._header.size, b'\0'))[:2]
+                if os.fstat(self.fd).st_size == 0 or (magic == self.magic and version != self.version):
+                    os.ftruncate(self.fd, 0)
+                    os.ftruncate(self.fd, self._header.size + slots * slot_size)
+                    os.pwrite(self.fd, self._header.pack(self.magic, self.version, slots, slot_size), 0)
+                magic, _, self.slots, self.slot_size = self._header.unpack(os.pread(self.fd, self._header.size, 0))
+            finally:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN)
+        if magic != self.magic:
+            os.close(self.fd)
+            raise ValueError(f'{path} is not a shared memo table')
+        self.map = mmap.mmap(self.fd, self._header.size + self.slots * self.slot_size)
+
+    def _probe(self, key_hash):
+        for i in range(self.max_probes):
+            yield self._header.size + (key_hash + i) % self.slots * self.slot_size
+
+    def get(self, key, default=None):
+        key_bytes = pickle.dumps(key)
+        key_hash = int.from_bytes(hashlib.blake2b(key_bytes, digest_size=8).digest(), 'little')
+        with self.lock:
+            fcntl.lockf(self.fd, fcntl.LOCK_SH)
+            try:
+                for offset in self._probe(key_hash):
+                    used, slot_hash, length = self._slot.unpack_from(self.map, offset)
+                    if not used:
+                        break
+                    if slot_hash == key_hash:
+                        start = offset + self._slot.size
+                        stored_key, value = pickle.loads(self.map[start:start + length])
+                        if stored_key == key:
+                            self.hits += 1
+                            return value
+            finally:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN)
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        key_hash = int.from_bytes(hashlib.blake2b(pickle.dumps(key), digest_size=8).digest(), 'little')
+        payload = pickle.dumps((key, value), pickle.HIGHEST_PROTOCOL)
+        if self._slot.size + len(payload) > self.slot_size:
+            return False
+        with self.lock:
+            fcntl.lockf(self.fd, fcntl.LOCK_EX)
+            try:
+                target = None
+                for offset in self._probe(key_hash):
+                    used, slot_hash, _ = self._slot.unpack_from(self.map, offset)
+                    if not used or slot_hash == key_hash:
+                        target = offset
+                        break
+                if target is None:
+                    target = next(self._probe(key_hash))
+                start = target + self._slot.size
+                self.map[start:start + len(payload)] = payload
+                self._slot.pack_into(self.map, target, 1, key_hash, len(payload))
+            finally:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN)
+        return True
+
+    def close(self):
+        self.map.close()
+        os.close(self.fd)
+
+
+_shared_stores = dict()  # (pid, real path) -> store, a forked child opens its own
+_shared_stores_lock = threading.Lock()
+
+
+def shared_store(path, slots=65536, slot_size=512):
+    """The one SharedMemoStore of `path` in this process, opened on first use."""
+    key = (os.getpid(), os.path.realpath(path))
+    with _shared_stores_lock:
+        store = _shared_stores.get(key)
+        if store is None:
+            store = _shared_stores[key] = SharedMemoStore(path, slots, slot_size)
+        return store
+
+
+def function_version(fn):
+    """A digest of `fn`'s code, so results cached by older code are not reused."""
+    return hashlib.blake2b(marshal.dumps(fn.__code__), digest_size=8).hexdigest()
+
+
+def shared_memoize(path, slots=65536, slot_size=512, version=None):
+    """Like memoize, but results live in a SharedMemoStore at `path`.
+
+    The store is opened lazily in each process, so decorated functions can
+    be used from forked or spawned pool workers alike. Arguments and
+    results must be picklable. Keys hold the function's module, qualified
+    name and `version`, which defaults to a digest of its code, so the
+    table can be shared by several functions and outlive code changes.
+    """
+    def decorator(fn):
+        # spawned workers import the main script as '__mp_main__'
+        module = '__main__' if fn.__module__ == '__mp_main__' else fn.__module__
+        identity = (module, fn.__qualname__, function_version(fn) if version is None else version)
+
+        def store():
+            return shared_store(path, slots, slot_size)
+
+        def memoized(*args, **kwargs):
+            key = (identity, args, tuple(sorted(kwargs.items())))
+            value = store().get(key, _MISSING)
+            if value is _MISSING:
+                value = fn(*args, **kwargs)
+                store().set(key, value)
+            return value
+
+        memoized.store = store
+        return functools.update_wrapper(memoized, fn)
+
+    return decorator
 
-    return memoized
 
 @memoize
 def fib(n):
@@ -18,6 +333,47 @@ def fib(n):
         return fib(n - 1) + fib(n - 2)
 
 
+@memoize(maxsize=1024)
+def distance(x, y, scale=1):
+    return ((x ** 2 + y ** 2) ** 0.5) * scale
+
+
+computations = 0
+
+
+@async_memoize(ttl=60)
+async def expensive_lookup(key):
+    global computations
+    computations += 1
+    await asyncio.sleep(0.1)
+    return key.upper()
+
+
+async def stampede(n=500):
+    start = time.perf_counter()
+    results = await asyncio.gather(*(expensive_lookup('report') for _ in range(n)))
+    elapsed = time.perf_counter() - start
+    print(f'{n} concurrent calls: {computations} computation(s), {elapsed * 1e3:.0f} ms, '
+          f'{len(set(results))} distinct result(s), {expensive_lookup.cache_info()}')
+
+
+@functools.lru_cache(maxsize=None)
+def lru_fib(n):
+    if n < 2:
+        return n
+    return lru_fib(n - 1) + lru_fib(n - 2)
+
+
+@functools.lru_cache(maxsize=1024)
+def lru_distance(x, y, scale=1):
+    return ((x ** 2 + y ** 2) ** 0.5) * scale
+
+
 if __name__ == "__main__":
     import timeit
-    print(timeit.timeit("fib(100)", "from __main__ import fib"))
\ No newline at end of file
+    print(timeit.timeit("fib(100)", "from __main__ import fib"))
+    print(timeit.timeit("lru_fib(100)", "from __main__ import lru_fib"))
+    print(timeit.timeit("distance(3, 4, scale=2)", "from __main__ import distance"))
+    print(timeit.timeit("lru_distance(3, 4, scale=2)", "from __main__ import lru_distance"))
+    print(fib.cache_info(), distance.cache_info())
+    asyncio.run(stampede())
@@ -0,0 +1,140 @@
+"""
+Benchmarks for the flyweight pattern
+------------------------------------
+Usage: python benchmarks.py [lookups] [types] [cars] [spatial sizes, e.g. 10000,1000000,10000000]
+"""
+import contextlib
+import heapq
+import io
+import math
+import random
+import sys
+import time
+import tracemalloc
+
+from flyweight_pattern import Car, CarPlacementStore, CarTypes, FlyweightFactory, render_batch, spatial_index
+
+COLORS = ['red', 'blue', 'green', 'violet', 'black', 'white']
+
+
+class CarModel:
+    def __init__(self, model):
+        self.model = model
+        self.specs = {'doors': 4, 'seats': 5, 'engine': f'{model}-engine'}
+
+
+def measure(make, keys):
+    tracemalloc.start()
+    start = time.perf_counter()
+    cars = [make(key) for key in keys]
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del cars
+    return elapsed, peak
+
+
+def bench_flyweight_factory(lookups, types):
+    keys = [f'model-{random.randrange(types)}' for _ in range(lookups)]
+    print(f'FlyweightFactory: {lookups:,} lookups over {types} types')
+    for label, make in (('new object per car', CarModel),
+                        ('FlyweightFactory', FlyweightFactory(CarModel).get),
+                        ('FlyweightFactory weak', FlyweightFactory(CarModel, weak=True).get)):
+        elapsed, peak = measure(make, keys)
+        print(f'  {label:<22} {lookups / elapsed:>12,.0f} lookups/s  peak {peak / 2 ** 20:>8.1f} MB '
+              f'({peak / lookups:.0f} B/car)')
+        if hasattr(make, '__self__'):
+            print(f'  {"":<22} {make.__self__.stats()}')
+
+
+class NullWriter(io.TextIOBase):
+    def write(self, text):
+        return len(text)
+
+
+def bench_render_batch(cars):
+    rnd = random.Random(7)
+    car_types = list(CarTypes)
+    print(f'render_batch: {cars:,} cars')
+
+    tracemalloc.start()
+    placements = [(Car(rnd.choice(car_types)), rnd.choice(COLORS), rnd.randint(0, 10_000), rnd.randint(0, 10_000))
+                  for _ in range(cars)]
+    objects_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    store = CarPlacementStore(COLORS)
+    for car, color, x, y in placements:
+        store.add(car, color, x, y)
+    store_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(NullWriter()):
+        for car, color, x, y in placements:
+            car.render(color, x, y)
+    per_object = time.perf_counter() - start
+
+    start = time.perf_counter()
+    render_batch(store, NullWriter())
+    batch = time.perf_counter() - start
+
+    print(f'  per object  {objects_bytes / cars:>6.1f} B/car  {cars / per_object:>12,.0f} cars/s')
+    print(f'  store       {store_bytes / cars:>6.1f} B/car  {cars / batch:>12,.0f} cars/s')
+
+
+def brute_rect(store, x0, y0, x1, y1):
+    return [i for i, (x, y) in enumerate(zip(store.xs, store.ys)) if x0 <= x <= x1 and y0 <= y <= y1]
+
+
+def brute_nearest(store, px, py, k):
+    return heapq.nsmallest(k, range(len(store)), key=lambda i: math.hypot(store.xs[i] - px, store.ys[i] - py))
+
+
+def time_queries(fn, queries):
+    start = time.perf_counter()
+    for query in queries:
+        fn(*query)
+    return (time.perf_counter() - start) / len(queries)
+
+
+def bench_spatial_index(sizes, world=100_000, queries=20):
+    rnd = random.Random(3)
+    print(f'Spatial index: {queries} viewport (1% of the world) and 10-NN queries')
+    for cars in sizes:
+        store = CarPlacementStore(COLORS)
+        suv = Car(CarTypes.suv)
+        for _ in range(cars):
+            store.add(suv, 'red', rnd.randrange(world), rnd.randrange(world))
+        side = world // 10
+        rects = [(x, y, x + side, y + side) for x, y in
+                 ((rnd.randrange(world - side), rnd.randrange(world - side)) for _ in range(queries))]
+        points = [(rnd.randrange(world), rnd.randrange(world), 10) for _ in range(queries)]
+
+        brute = (time_queries(lambda *q: brute_rect(store, *q), rects[:3]),
+                 time_queries(lambda *q: brute_nearest(store, *q), points[:3]))
+        print(f'  {cars:>10,} cars  brute force    rect {brute[0] * 1e3:>10.3f} ms  knn {brute[1] * 1e3:>10.3f} ms')
+        # about 16 cars per grid cell
+        cell_size = max(1, int(world / math.sqrt(cars / 16)))
+        for kind, options in (('grid', {'cell_size': cell_size}), ('quadtree', {'bounds': (0, 0, world, world)})):
+            start = time.perf_counter()
+            index = spatial_index(store, kind, **options).bulk_load()
+            build = time.perf_counter() - start
+            rect = time_queries(index.query_rect, rects)
+            knn = time_queries(index.nearest, points)
+            print(f'  {"":>16} {kind:<14} rect {rect * 1e3:>10.3f} ms  knn {knn * 1e3:>10.3f} ms  '
+                  f'(build {build:.1f} s)')
+
+
+def main():
+    lookups = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    types = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    bench_flyweight_factory(lookups, types)
+    bench_render_batch(int(sys.argv[3]) if len(sys.argv) > 3 else 1_000_000)
+    sizes = [int(size) for size in sys.argv[4].split(',')] if len(sys.argv) > 4 else [10_000, 1_000_000]
+    bench_spatial_index(sizes)
+
+
+if __name__ == '__main__':
+    main()
@@ -25,29 +25,397 @@ Requirements to identify the need of the flyweight pattern
 3. Objects' identity does not matter.
 
 """
+from array import array
 from enum import Enum
+import heapq
+import math
 import random
+import sys
+import threading
+import weakref
 
 
 CarTypes = Enum('CarTypes', 'subcompact compact suv')
 
 
-class Car:
-    pool = dict()
+class FlyweightFactory:
+    """Hands out one shared flyweight per key, built by `create(key)` on first use.
+
+    A hit is a plain dict read without locking, only a miss takes the lock
+    so that racing threads build a single flyweight. With weak=True the
+    pool holds weak references and unused flyweights can be collected.
+    Hit counts are not locked and may be slightly low under contention.
+    """
+
+    def __init__(self, create, weak=False):
+        self._create = create
+        self._pool = weakref.WeakValueDictionary() if weak else dict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        flyweight = self._pool.get(key)
+        if flyweight is not None:
+            self.hits += 1
+            return flyweight
+
+        with self._lock:
+            flyweight = self._pool.get(key)
+            if flyweight is None:
+                flyweight = self._create(key)
+                self._pool[key] = flyweight
+                self.misses += 1
+            else:
+                self.hits += 1
+        return flyweight
+
+    def __len__(self):
+        return len(self._pool)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'size': len(self._pool), 'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0}
 
+
+class Car:
     def __new__(cls, car_type) -> object:
-        car_type_obj = Car.pool.get(car_type, None)
-        if not car_type_obj:
-            car_type_obj = object.__new__(cls)
-            Car.pool[car_type] = car_type_obj
-            cls.car_type = car_type
-        return car_type_obj
+        return cls.pool.get(car_type)
+
+    @classmethod
+    def _create(cls, car_type):
+        car = object.__new__(cls)
+        # intrinsic state lives on the pooled instance, not on the class
+        car.car_type = car_type
+        return car
 
     def render(self, color, x, y) -> None:
         model = self.car_type
         print(f'render {model} car in {color} at location ({x}, {y})')
 
 
+Car.pool = FlyweightFactory(Car._create)
+
+
+class CarPlacementStore:
+    """Extrinsic state of many cars kept in parallel typed arrays.
+
+    Row i is a car of flyweight type `car_types[type_ids[i]]` in colour
+    `colors[color_ids[i]]` at (xs[i], ys[i]), about 10 bytes per car.
+    Spatial indexes over the store read the coordinates from it, so cars
+    must be moved with move(), which keeps every index in step.
+    """
+
+    def __init__(self, colors):
+        self.colors = list(colors)
+        self.car_types = []
+        self.type_ids = array('B')
+        self.color_ids = array('B')
+        self.xs = array('i')
+        self.ys = array('i')
+        self._type_index = dict()
+        self._color_index = {color: i for i, color in enumerate(self.colors)}
+        self.indexes = weakref.WeakSet()
+
+    def add(self, car, color, x, y):
+        type_id = self._type_index.get(car.car_type)
+        if type_id is None:
+            type_id = self._type_index[car.car_type] = len(self.car_types)
+            self.car_types.append(car.car_type)
+        self.type_ids.append(type_id)
+        self.color_ids.append(self._color_index[color])
+        self.xs.append(x)
+        self.ys.append(y)
+        return len(self.xs) - 1
+
+    def move(self, i, x, y):
+        """Move car i to (x, y) in the store and in every index over it.
+
+        Nothing changes if (x, y) is outside an index or the arrays.
+        """
+        xy = array(self.xs.typecode, (x, y))
+        indexes = list(self.indexes)
+        for index in indexes:
+            index.check(x, y)
+        # indexes find a car by its current coordinates, so file it out first
+        indexed = [index for index in indexes if index.discard(i)]
+        self.xs[i], self.ys[i] = xy
+        for index in indexed:
+            index.insert(i)
+
+    def car(self, i):
+        return Car(self.car_types[self.type_ids[i]])
+
+    def __len__(self):
+        return len(self.xs)
+
+
+def render_batch(store, sink=None, chunk_rows=65536):
+    """Render every car of `store` like Car.render, one write per `chunk_rows` cars."""
+    sink = sink if sink is not None else sys.stdout
+    # the text before the coordinates only depends on (type, colour)
+    prefixes = [[f'render {car_type} car in {color} at location (' for color in store.colors]
+                for car_type in store.car_types]
+    type_ids, color_ids, xs, ys = store.type_ids, store.color_ids, store.xs, store.ys
+    for start in range(0, len(store), chunk_rows):
+        stop = min(start + chunk_rows, len(store))
+        sink.write(''.join([f'{prefixes[type_ids[i]][color_ids[i]]}{xs[i]}, {ys[i]})\n'
+                            for i in range(start, stop)]))
+
+
+class GridIndex:
+    """Uniform grid over the cars of a CarPlacementStore.
+
+    Each cell lists the row ids inside it in an array; coordinates are read
+    from the store, so the index adds about 4 bytes per car.
+    """
+
+    def __init__(self, store, cell_size=64):
+        self.store = store
+        self.cell_size = cell_size
+        self.cells = dict()
+        self.count = 0
+        self.extent = None  # (cx0, cy0, cx1, cy1), the cells ever occupied
+        store.indexes.add(self)
+
+    def _cell(self, x, y):
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def bulk_load(self):
+        for car_id in range(len(self.store)):
+            self.insert(car_id)
+        return self
+
+    def check(self, x, y):
+        """A grid covers the whole plane, any position can be indexed."""
+
+    def insert(self, car_id):
+        """Index row `car_id` of the store at its current position."""
+        cx, cy = cell = self._cell(self.store.xs[car_id], self.store.ys[car_id])
+        ids = self.cells.get(cell)
+        if ids is None:
+            ids = self.cells[cell] = array('l')
+            if self.extent is None:
+                self.extent = (cx, cy, cx, cy)
+            else:
+                cx0, cy0, cx1, cy1 = self.extent
+                self.extent = (min(cx0, cx), min(cy0, cy), max(cx1, cx), max(cy1, cy))
+        ids.append(car_id)
+        self.count += 1
+
+    def discard(self, car_id):
+        """Drop the car from the index, return whether it was indexed."""
+        cell = self._cell(self.store.xs[car_id], self.store.ys[car_id])
+        ids = self.cells.get(cell)
+        try:
+            ids.remove(car_id)
+        except (AttributeError, ValueError):
+            return False
+        if not ids:
+            del self.cells[cell]
+        self.count -= 1
+        return True
+
+    def remove(self, car_id):
+        if not self.discard(car_id):
+            raise KeyError(car_id)
+
+    def move(self, car_id, x, y):
+        """Move the car, see CarPlacementStore.move."""
+        self.store.move(car_id, x, y)
+
+    def query_rect(self, x0, y0, x1, y1):
+        """Return the ids of the cars with x0 <= x <= x1 and y0 <= y <= y1."""
+        if self.extent is None:
+            return []
+        ex0, ey0, ex1, ey1 = self.extent
+        cx0, cy0 = self._cell(x0, y0)
+        cx1, cy1 = self._cell(x1, y1)
+        found = []
+        xs, ys = self.store.xs, self.store.ys
+        for cx in range(max(cx0, ex0), min(cx1, ex1) + 1):
+            for cy in range(max(cy0, ey0), min(cy1, ey1) + 1):
+                for car_id in self.cells.get((cx, cy), ()):
+                    if x0 <= xs[car_id] <= x1 and y0 <= ys[car_id] <= y1:
+                        found.append(car_id)
+        return found
+
+    def nearest(self, x, y, k=1):
+        """Return the ids of the k cars closest to (x, y), closest first."""
+        k = min(k, self.count)
+        if k <= 0:
+            return []
+        xs, ys = self.store.xs, self.store.ys
+        cx, cy = self._cell(x, y)
+        ex0, ey0, ex1, ey1 = self.extent
+        # rings closer than the occupied cells are empty, rings past them too
+        ring = max(ex0 - cx, cx - ex1, ey0 - cy, cy - ey1, 0)
+        last_ring = max(cx - ex0, ex1 - cx, cy - ey0, ey1 - cy)
+        best = []  # max-heap of (-distance, id)
+        while ring <= last_ring and (len(best) < k or -best[0][0] > (ring - 1) * self.cell_size):
+            for cell in self._ring(cx, cy, ring, self.extent):
+                for car_id in self.cells.get(cell, ()):
+                    d = math.hypot(xs[car_id] - x, ys[car_id] - y)
+                    if len(best) < k:
+                        heapq.heappush(best, (-d, car_id))
+                    elif d < -best[0][0]:
+                        heapq.heapreplace(best, (-d, car_id))
+            ring += 1
+        return [car_id for _, car_id in sorted(best, reverse=True)]
+
+    @staticmethod
+    def _ring(cx, cy, ring, extent):
+        """Yield the cells of the square ring around (cx, cy) that lie in `extent`."""
+        ex0, ey0, ex1, ey1 = extent
+        if ring == 0:
+            yield cx, cy
+            return
+        xs = range(max(cx - ring, ex0), min(cx + ring, ex1) + 1)
+        for y in (cy - ring, cy + ring):
+            if ey0 <= y <= ey1:
+                for x in xs:
+                    yield x, y
+        ys = range(max(cy - ring + 1, ey0), min(cy + ring - 1, ey1) + 1)
+        for x in (cx - ring, cx + ring):
+            if ex0 <= x <= ex1:
+                for y in ys:
+                    yield x, y
+
+
+class QuadTreeIndex:
+    """Quadtree over the cars of a CarPlacementStore within `bounds` (x0, y0, x1, y1).
+
+    Leaves list their row ids in an array and split into four once they
+    hold more than `capacity` cars; coordinates are read from the store.
+    """
+
+    def __init__(self, store, bounds, capacity=32):
+        self.store = store
+        self.capacity = capacity
+        self.root = self._node(*bounds)
+        store.indexes.add(self)
+
+    @staticmethod
+    def _node(x0, y0, x1, y1):
+        return {'bounds': (x0, y0, x1, y1), 'ids': array('l'), 'children': None}
+
+    def bulk_load(self):
+        for car_id in range(len(self.store)):
+            self.insert(car_id)
+        return self
+
+    def _leaf(self, x, y):
+        node = self.root
+        while node['children'] is not None:
+            x0, y0, x1, y1 = node['bounds']
+            mx, my = (x0 + x1) / 2, (y0 + y1) / 2
+            node = node['children'][(x >= mx) + 2 * (y >= my)]
+        return node
+
+    def check(self, x, y):
+        """Raise ValueError if (x, y) is outside the index bounds."""
+        x0, y0, x1, y1 = self.root['bounds']
+        if not (x0 <= x <= x1 and y0 <= y <= y1):
+            raise ValueError(f'({x}, {y}) is outside the index bounds')
+
+    def insert(self, car_id):
+        """Index row `car_id` of the store at its current position."""
+        x, y = self.store.xs[car_id], self.store.ys[car_id]
+        self.check(x, y)
+        node = self._leaf(x, y)
+        node['ids'].append(car_id)
+        if len(node['ids']) > self.capacity:
+            self._split(node)
+
+    def _split(self, node):
+        x0, y0, x1, y1 = node['bounds']
+        mx, my = (x0 + x1) / 2, (y0 + y1) / 2
+        if x1 - x0 <= 1 and y1 - y0 <= 1:
+            # cars stacked on one spot, nothing left to split
+            return
+        node['children'] = [self._node(x0, y0, mx, my), self._node(mx, y0, x1, my),
+                            self._node(x0, my, mx, y1), self._node(mx, my, x1, y1)]
+        ids, node['ids'] = node['ids'], array('l')
+        xs, ys = self.store.xs, self.store.ys
+        for car_id in ids:
+            child = node['children'][(xs[car_id] >= mx) + 2 * (ys[car_id] >= my)]
+            child['ids'].append(car_id)
+        for child in node['children']:
+            if len(child['ids']) > self.capacity:
+                self._split(child)
+
+    def discard(self, car_id):
+        """Drop the car from the index, return whether it was indexed."""
+        try:
+            self._leaf(self.store.xs[car_id], self.store.ys[car_id])['ids'].remove(car_id)
+        except ValueError:
+            return False
+        return True
+
+    def remove(self, car_id):
+        if not self.discard(car_id):
+            raise KeyError(car_id)
+
+    def move(self, car_id, x, y):
+        """Move the car, see CarPlacementStore.move."""
+        self.store.move(car_id, x, y)
+
+    def query_rect(self, x0, y0, x1, y1):
+        """Return the ids of the cars with x0 <= x <= x1 and y0 <= y <= y1."""
+        found = []
+        xs, ys = self.store.xs, self.store.ys
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            nx0, ny0, nx1, ny1 = node['bounds']
+            if nx0 > x1 or nx1 < x0 or ny0 > y1 or ny1 < y0:
+                continue
+            if node['children'] is not None:
+                stack.extend(node['children'])
+                continue
+            for car_id in node['ids']:
+                if x0 <= xs[car_id] <= x1 and y0 <= ys[car_id] <= y1:
+                    found.append(car_id)
+        return found
+
+    def nearest(self, x, y, k=1):
+        """Return the ids of the k cars closest to (x, y), closest first."""
+        found = []
+        xs, ys = self.store.xs, self.store.ys
+        # best-first search, nodes keyed by their distance to (x, y), cars by their own
+        queue = [(0.0, 0, self.root)]
+        counter = 1
+        while queue and len(found) < k:
+            d, _, item = heapq.heappop(queue)
+            if not isinstance(item, dict):
+                found.append(item)
+                continue
+            if item['children'] is not None:
+                for child in item['children']:
+                    heapq.heappush(queue, (self._distance(child['bounds'], x, y), counter, child))
+                    counter += 1
+                continue
+            for car_id in item['ids']:
+                heapq.heappush(queue, (math.hypot(xs[car_id] - x, ys[car_id] - y), counter, car_id))
+                counter += 1
+        return found
+
+    @staticmethod
+    def _distance(bounds, x, y):
+        x0, y0, x1, y1 = bounds
+        return math.hypot(max(x0 - x, 0, x - x1), max(y0 - y, 0, y - y1))
+
+
+def spatial_index(store, kind='grid', **options):
+    """Build an empty spatial index over `store`, 'grid' (cell_size) or
+    'quadtree' (bounds, capacity); bulk_load() then indexes every car."""
+    if kind == 'grid':
+        return GridIndex(store, **options)
+    if kind == 'quadtree':
+        return QuadTreeIndex(store, **options)
+    raise ValueError(f'Unknown spatial index: {kind}')
+
+
 def main():
     rnd = random.Random()
     colors = ['red', 'blue', 'green', 'violet', 'black', 'white']